@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Controller-side ARP responder.
+#
+# The controllers never flood, so without Mininet's autoStaticArp an ARP
+# request would go nowhere, and flooding it instead would put one copy
+# on every switch (and a packet-in per switch that misses). Here every
+# request is answered by the controller at the switch it entered: the
+# sender's IP is learned from the request itself, and if the target IP
+# belongs to a host in the host table the reply is built here and sent
+# back out of the requesting edge port with a single PacketOut. ARP then
+# costs one packet-in and one PacketOut per request, independent of the
+# number of switches.
+#
+# A request for an IP not seen yet cannot be answered. The controller
+# then hands the request itself to every switch's edge ports (never to an
+# inter-switch link, so it cannot loop or cause further packet-ins); the
+# target's unicast reply teaches the proxy its IP for every later request.
+#------------------------------------------------------------------------
+
+from ryu.lib.packet import packet, ethernet, arp, ether_types
+
+
+class ArpProxy(object):
+
+	def __init__(self, hosts):
+		self.hosts = hosts
+		self.macs = {}
+
+		#metrics
+		self.requests = 0
+		self.answered = 0
+		self.unknown = 0
+
+	def __len__(self):
+		return len(self.macs)
+
+	def learn(self, ip, mac):
+		if ip != '0.0.0.0':
+			self.macs[ip] = mac
+
+	def mac_of(self, ip):
+		return self.macs.get(ip)
+
+	def handle(self, request):
+		#Learns the sender of any ARP packet; returns the reply frame for a
+		#request whose target is known, None otherwise
+		self.learn(request.src_ip, request.src_mac)
+		if request.opcode != arp.ARP_REQUEST:
+			return None
+		self.requests += 1
+
+		#A host that is no longer in the table (its switch left) is unknown
+		mac = self.macs.get(request.dst_ip)
+		if mac is None or mac not in self.hosts:
+			self.unknown += 1
+			return None
+		self.answered += 1
+
+		reply = packet.Packet()
+		reply.add_protocol(ethernet.ethernet(ethertype=ether_types.ETH_TYPE_ARP,
+						dst=request.src_mac, src=mac))
+		reply.add_protocol(arp.arp(opcode=arp.ARP_REPLY,
+						src_mac=mac, src_ip=request.dst_ip,
+						dst_mac=request.src_mac, dst_ip=request.src_ip))
+		reply.serialize()
+		return reply.data
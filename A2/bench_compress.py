@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Rule compression (rulecompress.py) on the q1.py pair-mode rule set.
+#
+# For a generated topology, every switch gets the decisions q1.py would
+# install in pair mode: one (eth_src, eth_dst) output rule on each hop of
+# every host pair's path, and a drop at the ingress switch for pairs the
+# odd/even firewall blocks. Each switch's decisions are compressed and the
+# result is checked by replaying sampled pairs.
+#
+# With --commands, the exact firewall / route entries of a P4 commands.txt
+# (A3) are compressed instead, as one switch keyed on (smac, dmac). Those
+# tables use exact keys, so the compressed entries would need ternary ones.
+#
+# usage: python bench_compress.py [switches:hosts:extra_links ...]
+#        python bench_compress.py --commands ../A3/Q1/commands.txt
+#------------------------------------------------------------------------
+
+import sys
+import time
+
+from pathcache import PathCache
+from rulecompress import compress, verify, MISS
+from topocore import mac_to_int
+from topogen import random_topology, attach_hosts
+
+DEFAULT_SIZES = ['8:8:2', '20:200:10', '50:500:25']
+
+
+def pair_decisions(n_switches, n_hosts, extra_links):
+	links = random_topology(n_switches, extra_links)
+	hosts = attach_hosts(n_switches, n_hosts)
+	paths = PathCache()
+	for (u, v) in links:
+		paths.add_link(u, v)
+
+	decisions = dict((s, {}) for s in range(1, n_switches + 1))
+	for src, (src_id, _) in hosts.items():
+		s = mac_to_int(src)
+		for dst, (dst_id, dst_port) in hosts.items():
+			if src == dst:
+				continue
+			d = mac_to_int(dst)
+			if src_id % 2 != dst_id % 2:
+				decisions[src_id][(s, d)] = 'drop'
+				continue
+			path = paths.get(src_id, dst_id)
+			if path is None:
+				continue
+			for u, v in zip(path, path[1:]):
+				decisions[u][(s, d)] = ('output', links[(u, v)])
+			decisions[dst_id][(s, d)] = ('output', dst_port)
+	return decisions
+
+
+def command_decisions(filename):
+	decisions = {}
+	for line in open(filename):
+		words = line.split()
+		if len(words) < 7 or words[0] != 'table_add':
+			continue
+		key = (mac_to_int(words[3]), mac_to_int(words[4]))
+		if words[2] == 'drop':
+			decisions[key] = 'drop'
+		else:
+			decisions[key] = (words[2],) + tuple(words[words.index('=>') + 1:])
+	return {1: decisions}
+
+
+def report(label, decisions, default=None):
+	start = time.time()
+	before = after = wrong = 0
+	for dpid in sorted(decisions):
+		rules = compress(decisions[dpid], default=default)
+		before += len(decisions[dpid])
+		after += len(rules)
+		wrong += len(verify(decisions[dpid], rules))
+	elapsed = time.time() - start
+	print('%-14s %-8s | %8d %8d %8.1fx %8d %8.2f' % (label,
+		default or 'free', before, after, float(before) / max(after, 1),
+		wrong, elapsed))
+
+
+def main(argv):
+	print('%-14s %-8s | %8s %8s %9s %8s %8s' % ('rules', 'default', 'exact',
+		'compr', 'factor', 'wrong', 'secs'))
+	if len(argv) > 2 and argv[1] == '--commands':
+		for filename in argv[2:]:
+			decisions = command_decisions(filename)
+			for default in (None, MISS):
+				report(filename.split('/')[-2], decisions, default)
+		return
+	for size in argv[1:] or DEFAULT_SIZES:
+		n_switches, n_hosts, extra = [int(x) for x in size.split(':')]
+		decisions = pair_decisions(n_switches, n_hosts, extra)
+		for default in (None, MISS):
+			report(size, decisions, default)
+
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Port counter history: counterstore.CounterStore against keeping every
+# reply in a per-port Python list (what printing and re-parsing the raw
+# counters amounts to). Feeds `switches` x PORTS ports for SAMPLES polls
+# and reports ingest time per sample, the time of a range query and a
+# moving average over the last RANGE seconds of every port, and memory.
+# Also checks both give the same rates.
+#
+# usage: python bench_counters.py [switches ...]
+#------------------------------------------------------------------------
+
+import random
+import sys
+import time
+import tracemalloc
+
+from counterstore import CounterStore, PORT_FIELDS, counter_delta
+
+PORTS = 8
+SAMPLES = 240
+INTERVAL = 5.0
+DEPTH = 120
+RANGE = 300.0
+
+
+class ListStore(object):
+
+	#Unbounded lists of (time, counters) per key; rates from neighbours
+	def __init__(self):
+		self.samples = {}
+
+	def add(self, key, values, when):
+		self.samples.setdefault(key, []).append((when, values))
+
+	def series(self, key, since):
+		samples = self.samples[key]
+		rates = []
+		for (then, old), (now, new) in zip(samples, samples[1:]):
+			if now >= since:
+				rates.append([counter_delta(a, b) / (now - then) for a, b in zip(old, new)])
+		return rates
+
+	def average(self, key, window):
+		samples = self.samples[key]
+		now, new = samples[-1]
+		start = [s for s in samples if s[0] >= now - window - INTERVAL / 2][0]
+		return [counter_delta(a, b) / (now - start[0]) for a, b in zip(start[1], new)]
+
+
+def feed(store, keys, list_store=False):
+	rnd = random.Random(3)
+	counters = dict((key, [rnd.randrange(1 << 31) for _ in PORT_FIELDS]) for key in keys)
+	start = time.time()
+	for sample in range(SAMPLES):
+		when = sample * INTERVAL
+		for key in keys:
+			values = counters[key]
+			for i in range(len(values)):
+				values[i] = (values[i] + rnd.randrange(10000)) % (1 << 32)
+			if list_store:
+				store.add(key, tuple(values), when)
+			else:
+				store.add(key, tuple(values), when=when)
+	return time.time() - start
+
+
+def run(n_switches):
+	keys = [(dpid, port) for dpid in range(1, n_switches + 1) for port in range(1, PORTS + 1)]
+	results = {}
+	for name in ('ring', 'lists'):
+		make = name == 'ring' and (lambda: CounterStore(PORT_FIELDS,
+			capacity=len(keys), depth=DEPTH)) or ListStore
+		#Memory on a second run, as tracing allocations slows the first
+		store = make()
+		ingest = feed(store, keys, name == 'lists')
+		tracemalloc.start()
+		traced = make()
+		feed(traced, keys, name == 'lists')
+		memory = tracemalloc.get_traced_memory()[0]
+		tracemalloc.stop()
+		del traced
+
+		since = (SAMPLES - 1) * INTERVAL - RANGE
+		start = time.time()
+		for key in keys:
+			store.series(key, since)
+			store.average(key, RANGE)
+		query = time.time() - start
+		results[name] = (store, ingest, query, memory)
+
+	ring, lists = results['ring'][0], results['lists'][0]
+	mismatches = 0
+	for key in keys[:50]:
+		a = ring.series(key, since)[1]
+		b = lists.series(key, since)
+		if len(a) != len(b) or abs(a - b).max() > 1e-6:
+			mismatches += 1
+	for name in ('ring', 'lists'):
+		store, ingest, query, memory = results[name]
+		print('%6d %-6s | %12.2f %12.1f %10.1f %10d' % (n_switches, name,
+			ingest / (SAMPLES * len(keys)) * 1e6, query / len(keys) * 1e6,
+			memory / 1024.0 / 1024, mismatches))
+
+
+def main(argv):
+	sizes = [int(x) for x in argv[1:]] or [10, 100, 500]
+	print('%6s %-6s | %12s %12s %10s %10s' % ('sw', 'store', 'add us/smpl',
+		'query us/key', 'memory MB', 'mismatch'))
+	for n_switches in sizes:
+		run(n_switches)
+
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# FlowMods encoded per second: the add_flow path (Ryu parser objects +
+# serialize) against flowtemplate.FlowModTemplate. Also checks that both
+# produce the same bytes.
+#
+# usage: python bench_flowmod.py [count]
+#------------------------------------------------------------------------
+
+import sys
+import time
+
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto.ofproto_protocol import ProtocolDesc
+
+from flowtemplate import FlowModTemplate
+from topogen import int_to_mac
+
+
+def encode_ryu(datapath, xid, dst, src, port, cookie):
+	ofproto = datapath.ofproto
+	parser = datapath.ofproto_parser
+
+	match = parser.OFPMatch(eth_dst=dst, eth_src=src)
+	actions = [parser.OFPActionOutput(port)]
+	inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+						actions)]
+	mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie, priority=1,
+				match=match, instructions=inst)
+	mod.set_xid(xid)
+	mod.serialize()
+	return bytes(mod.buf)
+
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 100000
+	datapath = ProtocolDesc(ofproto_v1_3.OFP_VERSION)
+	template = FlowModTemplate(1)
+	macs = [int_to_mac(i + 1) for i in range(256)]
+	work = [(i, macs[i % 256], macs[(i * 7 + 1) % 256], i % 48 + 1, i)
+			for i in range(count)]
+
+	for args in work[:1000]:
+		if encode_ryu(datapath, *args) != template.encode(*args):
+			print('MISMATCH for %s' % (args,))
+			return 1
+
+	start = time.time()
+	for args in work:
+		encode_ryu(datapath, *args)
+	ryu_time = time.time() - start
+
+	start = time.time()
+	for args in work:
+		template.encode(*args)
+	template_time = time.time() - start
+
+	print('%d FlowMods' % count)
+	print('ryu objects + serialize: %10.0f msgs/s' % (count / ryu_time))
+	print('template:                %10.0f msgs/s' % (count / template_time))
+	print('speedup:                 %10.1fx' % (ryu_time / template_time))
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Load test for pathworker.PathWorkers on a generated topology.
+#
+# A single-threaded loop stands in for the Ryu hub. It is fed, in real
+# time, with packet-ins for random host pairs (Poisson arrivals), an echo
+# request every millisecond (LLDP / echo / stats traffic) and a link flap
+# every 200 ms that invalidates the paths crossing it. Each run reports
+# latency percentiles from arrival until the event is handled: for a
+# packet-in, until its path is known; for an echo, until it is answered.
+#
+#   inline:  PathCache.get() on the loop, as _packet_in_handler does
+#   offload: misses batched to PathWorkers, results polled by the loop
+#
+# usage: python bench_offload.py [switches] [pkt_ins_per_s] [seconds] [workers]
+#------------------------------------------------------------------------
+
+import random
+import sys
+import time
+
+from pathcache import PathCache
+from pathworker import PathWorkers
+from topogen import random_topology
+
+ECHO_INTERVAL = 0.001
+FLAP_INTERVAL = 0.2
+TICK = 0.001
+
+
+def make_schedule(n_switches, rate, seconds, links, seed=1):
+	rnd = random.Random(seed)
+	events = []
+	t = 0.0
+	while t < seconds:
+		t += rnd.expovariate(rate)
+		src = rnd.randint(1, n_switches)
+		dst = rnd.randint(1, n_switches)
+		events.append((t, 'packet_in', (src, dst)))
+	for i in range(int(seconds / ECHO_INTERVAL)):
+		events.append((i * ECHO_INTERVAL, 'echo', None))
+	link_keys = sorted(links)
+	for i in range(1, int(seconds / FLAP_INTERVAL)):
+		events.append((i * FLAP_INTERVAL, 'flap', rnd.choice(link_keys)))
+	events.sort(key=lambda e: e[0])
+	return events
+
+
+def build_paths(links):
+	paths = PathCache()
+	for (u, v) in links:
+		paths.add_link(u, v)
+	return paths
+
+
+def run(events, links, workers=None):
+	paths = build_paths(links)
+	if workers is not None:
+		workers.paths = paths
+	latency = {'packet_in': [], 'echo': []}
+
+	start = time.time()
+	last_tick = 0.0
+	i = 0
+	while i < len(events) or (workers is not None and len(workers)):
+		now = time.time() - start
+		if i < len(events) and events[i][0] <= now:
+			arrival, kind, arg = events[i]
+			i += 1
+			if kind == 'flap':
+				u, v = arg
+				paths.remove_link(u, v)
+				paths.remove_link(v, u)
+				paths.add_link(u, v)
+				paths.add_link(v, u)
+				if workers is not None:
+					workers.invalidate()
+			elif kind == 'echo':
+				latency['echo'].append(time.time() - start - arrival)
+			elif workers is None or arg in paths:
+				paths.get(*arg)
+				latency['packet_in'].append(time.time() - start - arrival)
+			else:
+				workers.request(arg, arrival)
+		elif workers is None:
+			time.sleep(0.0001)
+
+		#the collector thread: one flush and poll per tick
+		if workers is not None and now - last_tick >= TICK:
+			last_tick = now
+			workers.flush()
+			now = time.time() - start
+			for key, path, arrivals in workers.done():
+				for arrival in arrivals:
+					latency['packet_in'].append(now - arrival)
+		elif workers is not None and (i == len(events) or events[i][0] > now):
+			time.sleep(0.0001)
+	return latency
+
+
+def percentiles(values):
+	values = sorted(values)
+	pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+	return '%8.2f %8.2f %8.2f %8.2f' % (pick(0.5), pick(0.9), pick(0.99), values[-1] * 1000)
+
+
+def main(argv):
+	n_switches = int(argv[1]) if len(argv) > 1 else 500
+	rate = float(argv[2]) if len(argv) > 2 else 3000
+	seconds = float(argv[3]) if len(argv) > 3 else 3
+	n_workers = int(argv[4]) if len(argv) > 4 else 2
+
+	links = random_topology(n_switches, n_switches // 2)
+	events = make_schedule(n_switches, rate, seconds, links)
+	workers = PathWorkers(build_paths(links), n_workers)
+	#start the worker processes before measuring
+	workers.executor.submit(sum, []).result()
+
+	print('%d switches, %d links, %.0f packet-ins/s for %.0fs, %d workers' % (
+		n_switches, len(links), rate, seconds, n_workers))
+	print('%-8s %-9s | %8s %8s %8s %8s  (ms)' % ('mode', 'event', 'p50', 'p90',
+							'p99', 'max'))
+	for mode, pool in (('inline', None), ('offload', workers)):
+		latency = run(events, links, pool)
+		for kind in ('packet_in', 'echo'):
+			print('%-8s %-9s | %s' % (mode, kind, percentiles(latency[kind])))
+	print('offload jobs: %d for %d requests, %d resubmitted after a flap' % (
+		workers.submitted, workers.requested, workers.resubmitted))
+	workers.shutdown()
+
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Packet-ins parsed per second: the handlers' packet.Packet(msg.data) +
+# get_protocol() path against pktview.PacketView, reading eth src/dst
+# (every handler) and eth src/dst + tcp_dst (multi-table-odd-even). Also
+# checks that both return the same fields.
+#
+# usage: python bench_pktin.py [count]
+#------------------------------------------------------------------------
+
+import sys
+import time
+
+from ryu.lib.packet import packet, ethernet, ipv4, tcp, arp
+
+from pktview import PacketView
+from topogen import int_to_mac
+
+
+def make_frames(n):
+	frames = []
+	for i in range(n):
+		src, dst = int_to_mac(i % 64 + 1), int_to_mac((i * 7) % 64 + 1)
+		pkt = packet.Packet()
+		if i % 8 == 0:
+			pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=src,
+							ethertype=0x0806))
+			pkt.add_protocol(arp.arp(src_mac=src, src_ip='10.0.0.1', dst_ip='10.0.0.2'))
+		else:
+			pkt.add_protocol(ethernet.ethernet(dst=dst, src=src, ethertype=0x0800))
+			pkt.add_protocol(ipv4.ipv4(src='10.0.0.1', dst='10.0.0.2', proto=6))
+			pkt.add_protocol(tcp.tcp(src_port=40000 + i % 1000, dst_port=5000 + i % 1000))
+			pkt.add_protocol(b'x' * 64)
+		pkt.serialize()
+		frames.append(bytes(pkt.data))
+	return frames
+
+
+def ryu_eth(data):
+	eth = packet.Packet(data).get_protocol(ethernet.ethernet)
+	return eth.src, eth.dst
+
+
+def ryu_tcp(data):
+	pkt = packet.Packet(data)
+	eth = pkt.get_protocol(ethernet.ethernet)
+	tcp_info = pkt.get_protocol(tcp.tcp)
+	return eth.src, eth.dst, tcp_info.dst_port if tcp_info is not None else None
+
+
+def view_eth(data):
+	view = PacketView(data)
+	return view.src, view.dst
+
+
+def view_tcp(data):
+	view = PacketView(data)
+	return view.src, view.dst, view.tcp_dst
+
+
+def rate(func, frames):
+	start = time.time()
+	for data in frames:
+		func(data)
+	return len(frames) / (time.time() - start)
+
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 50000
+	frames = make_frames(1000)
+	frames = (frames * (count // len(frames) + 1))[:count]
+
+	for data in frames[:1000]:
+		if ryu_tcp(data) != view_tcp(data):
+			print('MISMATCH for %r' % (data,))
+			return 1
+
+	print('%d packet-ins' % count)
+	for name, slow, fast in (('eth src/dst', ryu_eth, view_eth),
+				('eth + tcp_dst', ryu_tcp, view_tcp)):
+		ryu_rate = rate(slow, frames)
+		view_rate = rate(fast, frames)
+		print('%-14s ryu %10.0f pkts/s   view %10.0f pkts/s   %5.1fx' % (name,
+					ryu_rate, view_rate, view_rate / ryu_rate))
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Flow-rule footprint of the two q1.py routing modes on generated
+# topologies (no switches or Ryu needed).
+#
+#   pair: one (eth_src, eth_dst) rule per switch on every host pair's path
+#   tree: one eth_dst rule per (switch, destination)
+#
+# Every rule is one FlowMod. The counts assume one packet-in per host pair
+# (pair mode) or per destination (tree mode), i.e. the best case for the
+# reactive controller.
+# Byte counts use the encoded OpenFlow 1.3 sizes of those FlowMods.
+#
+# usage: python bench_rules.py [switches:hosts:extra_links ...]
+#------------------------------------------------------------------------
+
+import sys
+import time
+
+from pathcache import PathCache
+from fwdtree import dest_tree
+from topogen import random_topology, attach_hosts
+
+#ofp_flow_mod (48) + padded OXM match + apply-actions(output) (8 + 16)
+PAIR_FLOWMOD_BYTES = 48 + 24 + 24
+TREE_FLOWMOD_BYTES = 48 + 16 + 24
+
+DEFAULT_SIZES = ['8:8:2', '50:500:25', '200:2000:100']
+
+
+def bench(n_switches, n_hosts, extra_links):
+	links = random_topology(n_switches, extra_links)
+	hosts = attach_hosts(n_switches, n_hosts)
+
+	per_switch = {}
+	for dpid, port in hosts.values():
+		per_switch[dpid] = per_switch.get(dpid, 0) + 1
+
+	paths = PathCache()
+	for (u, v) in links:
+		paths.add_link(u, v)
+
+	start = time.time()
+	pair_rules = 0
+	for s, n_src in per_switch.items():
+		for d, n_dst in per_switch.items():
+			path = paths.get(s, d)
+			if path is None:
+				continue
+			pairs = n_src * n_dst - (n_src if s == d else 0)
+			pair_rules += pairs * len(path)
+	pair_time = time.time() - start
+
+	start = time.time()
+	tree_rules = 0
+	for d, n_dst in per_switch.items():
+		tree_rules += n_dst * len(dest_tree(paths.adj, d))
+	tree_time = time.time() - start
+
+	return pair_rules, tree_rules, pair_time, tree_time
+
+
+def main(argv):
+	sizes = argv[1:] or DEFAULT_SIZES
+	print('%8s %8s %6s | %12s %12s | %10s %10s | %8s' % ('switches', 'hosts',
+		'extra', 'pair rules', 'tree rules', 'pair MB', 'tree MB', 'ratio'))
+	for size in sizes:
+		n_switches, n_hosts, extra = [int(x) for x in size.split(':')]
+		pair_rules, tree_rules, pair_time, tree_time = bench(n_switches,
+									n_hosts, extra)
+		print('%8d %8d %6d | %12d %12d | %10.2f %10.2f | %7.1fx' % (
+			n_switches, n_hosts, extra, pair_rules, tree_rules,
+			pair_rules * PAIR_FLOWMOD_BYTES / 1e6,
+			tree_rules * TREE_FLOWMOD_BYTES / 1e6,
+			float(pair_rules) / max(tree_rules, 1)))
+
+
+if __name__ == '__main__':
+	main(sys.argv)
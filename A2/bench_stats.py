@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Controller load of stats polling versus switch count (simulated time,
+# no switches or Ryu needed).
+#
+# Every switch carries ROUTE_FLOWS routing rules and OTHER_FLOWS static /
+# firewall rules. Its traffic comes and goes: in each EPOCH it is busy
+# with probability BUSY, and only a busy switch's counters move.
+#
+#   sync:    every switch every 10 s at the same instant, all flows
+#            (the old _monitor loops)
+#   poller:  statspoll.StatsPoller (random phase, jitter, adaptive
+#            5..20 s interval), routing rules only (cookie-narrowed)
+#
+# Reported: stats requests and reply bytes per second, the peak of both
+# in any 100 ms window (the burst the controller has to absorb at once),
+# how long a switch turning busy goes unnoticed, and the poller's own
+# bookkeeping time per simulated second.
+#
+# usage: python bench_stats.py [switches ...]
+#------------------------------------------------------------------------
+
+import random
+import sys
+import time
+
+from statspoll import StatsPoller
+
+ROUTE_FLOWS = 200
+OTHER_FLOWS = 50
+EPOCH = 30.0
+BUSY = 0.2
+DURATION = 600.0
+TICK = 0.1
+WINDOW = 0.1
+
+#multipart reply header + ofp_flow_stats with an eth_src/eth_dst match and
+#one output action
+REPLY_HEADER = 16
+FLOW_STATS_BYTES = 56 + 24 + 24
+
+
+class Switch(object):
+
+	def __init__(self, dpid):
+		self.id = dpid
+
+
+def activity(n_switches, seed=1):
+	#(busy[epoch][dpid], phase[dpid]): every switch's epochs start at its
+	#own offset, so busy periods do not line up with any poll schedule
+	rnd = random.Random(seed)
+	epochs = int(DURATION / EPOCH) + 2
+	busy = [[rnd.random() < BUSY for _ in range(n_switches)] for _ in range(epochs)]
+	phase = [rnd.uniform(0, EPOCH) for _ in range(n_switches)]
+	return busy, phase
+
+
+def counters(load, dpid, now):
+	#Packet total of a switch: grows by 1000/s while busy
+	busy, phase = load
+	now += phase[dpid]
+	total = 0.0
+	for epoch in range(int(now / EPOCH) + 1):
+		if busy[epoch][dpid]:
+			total += 1000 * (min(now, (epoch + 1) * EPOCH) - epoch * EPOCH)
+	return int(total)
+
+
+def detection(load, polls):
+	#Mean delay between a switch turning busy and its next poll
+	busy, phase = load
+	delays = []
+	for dpid, times in polls.items():
+		times = sorted(times)
+		for epoch in range(1, len(busy)):
+			if busy[epoch][dpid] and not busy[epoch - 1][dpid]:
+				start = epoch * EPOCH - phase[dpid]
+				later = [t for t in times if t >= start]
+				if later and start < DURATION:
+					delays.append(later[0] - start)
+	return sum(delays) / max(1, len(delays))
+
+
+def run(n_switches, mode):
+	load = activity(n_switches)
+	windows = {}
+	polls = dict((dpid, []) for dpid in range(n_switches))
+	requests = 0
+	reply_bytes = 0
+	bookkeeping = 0.0
+
+	clock = [0.0]
+	poller = StatsPoller(None, 10.0, clock=lambda: clock[0], seed=2)
+	for dpid in range(n_switches):
+		poller.add(Switch(dpid))
+
+	steps = int(DURATION / TICK)
+	for step in range(steps):
+		now = clock[0] = step * TICK
+		if mode == 'sync':
+			due = [dpid for dpid in range(n_switches) if step % int(10 / TICK) == 0]
+			size = REPLY_HEADER + (ROUTE_FLOWS + OTHER_FLOWS) * FLOW_STATS_BYTES
+		else:
+			start = time.time()
+			due = [switch.id for switch in poller.due()]
+			bookkeeping += time.time() - start
+			size = REPLY_HEADER + ROUTE_FLOWS * FLOW_STATS_BYTES
+
+		window = int(now / WINDOW)
+		for dpid in due:
+			polls[dpid].append(now)
+			requests += 1
+			reply_bytes += size
+			count, nbytes = windows.get(window, (0, 0))
+			windows[window] = (count + 1, nbytes + size)
+			if mode != 'sync':
+				start = time.time()
+				poller.reply(dpid, counters(load, dpid, now))
+				bookkeeping += time.time() - start
+
+	peak_requests = max(c for c, b in windows.values()) if windows else 0
+	peak_bytes = max(b for c, b in windows.values()) if windows else 0
+	return (requests / DURATION, reply_bytes / DURATION / 1024, peak_requests,
+		peak_bytes / 1024, detection(load, polls), bookkeeping / DURATION * 1000)
+
+
+def main(argv):
+	sizes = [int(x) for x in argv[1:]] or [10, 100, 1000]
+	print('%6s %-7s | %8s %9s %9s %10s %9s %9s' % ('sw', 'mode', 'req/s',
+		'KB/s', 'peak req', 'peak KB', 'detect s', 'cpu ms/s'))
+	for n_switches in sizes:
+		for mode in ('sync', 'poller'):
+			print('%6d %-7s | %8.1f %9.1f %9d %10.1f %9.2f %9.3f' % (
+				(n_switches, mode) + run(n_switches, mode)))
+
+
+if __name__ == '__main__':
+	main(sys.argv)
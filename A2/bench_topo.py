@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Memory and lookup cost of the topology store: the networkx DiGraph the
+# controllers used to build (hosts as nodes, ports as edge attributes)
+# against topocore.Topology + hosttable.HostTable, on generated topologies.
+#
+# usage: python bench_topo.py [switches:hosts:extra_links ...]
+#------------------------------------------------------------------------
+
+import random
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+
+from topocore import Topology
+from hosttable import HostTable
+from topogen import random_topology, attach_hosts
+
+DEFAULT_SIZES = ['100:10000:50', '1000:100000:500', '2000:200000:1000']
+LOOKUPS = 200000
+
+
+def build_nx(links, hosts):
+	net = nx.DiGraph()
+	net.add_nodes_from(set(u for (u, v) in links))
+	for (u, v), port in links.items():
+		net.add_edge(u, v, port=port)
+	for mac, (dpid, port) in hosts.items():
+		net.add_node(mac)
+		net.add_edge(dpid, mac, port=port)
+		net.add_edge(mac, dpid)
+	return net
+
+
+def build_core(links, hosts):
+	net = Topology()
+	for (u, v), port in links.items():
+		net.add_link(u, v, port)
+	table = HostTable()
+	for mac, (dpid, port) in hosts.items():
+		table.learn(mac, dpid, port)
+	net.neighbors(1)
+	return net, table
+
+
+def measure(build, *args):
+	tracemalloc.start()
+	start = time.time()
+	net = build(*args)
+	elapsed = time.time() - start
+	size = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return net, size, elapsed
+
+
+def lookups_nx(net, edges, macs):
+	start = time.time()
+	for (u, v), mac in zip(edges, macs):
+		net[u][v]['port']
+		list(net[mac].keys())[0]
+		list(net.neighbors(u))
+	return time.time() - start
+
+
+def lookups_core(core, edges, macs):
+	net, table = core
+	start = time.time()
+	for (u, v), mac in zip(edges, macs):
+		net.port(u, v)
+		table.switch(mac)
+		net.neighbors(u)
+	return time.time() - start
+
+
+def main(argv):
+	sizes = argv[1:] or DEFAULT_SIZES
+	print('%8s %8s | %10s %10s | %10s %10s | %12s %12s' % ('switches', 'hosts',
+		'nx MB', 'core MB', 'nx build', 'core build', 'nx lookup/s',
+		'core lookup/s'))
+	for size in sizes:
+		n_switches, n_hosts, extra = [int(x) for x in size.split(':')]
+		links = random_topology(n_switches, extra)
+		hosts = attach_hosts(n_switches, n_hosts)
+
+		rnd = random.Random(1)
+		link_keys = list(links)
+		host_keys = list(hosts)
+		edges = [rnd.choice(link_keys) for i in range(LOOKUPS)]
+		macs = [rnd.choice(host_keys) for i in range(LOOKUPS)]
+
+		net_nx, nx_bytes, nx_build = measure(build_nx, links, hosts)
+		nx_time = lookups_nx(net_nx, edges, macs)
+		del net_nx
+
+		net_core, core_bytes, core_build = measure(build_core, links, hosts)
+		core_time = lookups_core(net_core, edges, macs)
+
+		print('%8d %8d | %10.1f %10.1f | %9.2fs %9.2fs | %12d %12d' % (
+			n_switches, n_hosts, nx_bytes / 1e6, core_bytes / 1e6,
+			nx_build, core_build, LOOKUPS / nx_time, LOOKUPS / core_time))
+
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,200 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Time series of switch counters.
+#
+# Port and flow stats replies carry cumulative counters; what the
+# controller wants is how fast they move. CounterStore keeps, for every
+# key ((dpid, port_no) or (dpid, cookie)), a ring of the last `depth`
+# samples in preallocated NumPy arrays:
+#
+#   samples[row, slot, 0]      when the reply arrived
+#   samples[row, slot, 1]      seconds since the key's previous sample
+#   samples[row, slot, 2 + f]  increase of counter f over that span
+#
+# so rates are increases / spans and a moving average over a window is the
+# sum of its increases over the sum of its spans. Memory is fixed at
+# capacity * depth samples: when every row is taken, the key updated
+# longest ago gives its row up.
+#
+# Counters that go backwards are told apart as follows:
+#   - the switch reports a smaller duration (it or the flow restarted),
+#     or the old value was in the bottom half of its range: the counter
+#     was reset, and everything counted since is new;
+#   - otherwise it wrapped, at 2^32 if the old value fits in 32 bits
+#     (some switches still keep 32-bit port counters), else at 2^64.
+# The first sample of a key, and of a key after forget(), only sets the
+# baseline.
+#------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+WRAP32 = 1 << 32
+WRAP64 = 1 << 64
+
+PORT_FIELDS = ('rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes')
+FLOW_FIELDS = ('packet_count', 'byte_count')
+
+
+def counter_delta(old, new, reset=False):
+	if new >= old and not reset:
+		return new - old
+	wrap = WRAP32 if old < WRAP32 else WRAP64
+	if reset or old < wrap // 2:
+		return new
+	return new + wrap - old
+
+
+class CounterStore(object):
+
+	def __init__(self, fields, capacity=1024, depth=120, clock=time.time):
+		self.fields = tuple(fields)
+		self.capacity = capacity
+		self.depth = depth
+		self.clock = clock
+
+		self.samples = np.zeros((capacity, depth, 2 + len(self.fields)))
+		self.updated = np.zeros(capacity)
+
+		#Per-row ring state, touched on every add, as plain lists
+		self.rows = {}
+		self.keys = [None] * capacity
+		self.last = [None] * capacity
+		self.heads = [0] * capacity
+		self.counts = [0] * capacity
+		self.free = list(range(capacity - 1, -1, -1))
+
+		#metrics
+		self.wraps = 0
+		self.resets = 0
+		self.recycled = 0
+
+	def __contains__(self, key):
+		return key in self.rows
+
+	def __len__(self):
+		return len(self.rows)
+
+	def nbytes(self):
+		return self.samples.nbytes + self.updated.nbytes
+
+	def _row(self, key):
+		row = self.rows.get(key)
+		if row is not None:
+			return row
+		if self.free:
+			row = self.free.pop()
+		else:
+			#Full: take over the row of the key updated longest ago
+			row = int(np.argmin(self.updated))
+			del self.rows[self.keys[row]]
+			self.recycled += 1
+		self.rows[key] = row
+		self.keys[row] = key
+		self.last[row] = None
+		self.heads[row] = 0
+		self.counts[row] = 0
+		return row
+
+	def add(self, key, values, duration=None, when=None):
+		#values: the cumulative counters, in the order of self.fields;
+		#duration: the reply's duration_sec (+ nsec), if it has one.
+		#Returns the rates since the previous sample, or None for a baseline
+		when = self.clock() if when is None else when
+		row = self._row(key)
+		self.updated[row] = when
+		previous = self.last[row]
+		self.last[row] = (when, tuple(values), duration)
+		if previous is None:
+			return None
+		then, old_values, old_duration = previous
+		span = when - then
+		if span <= 0:
+			return None
+
+		reset = duration is not None and old_duration is not None and duration < old_duration
+		sample = [when, span]
+		rates = []
+		restarted = reset
+		wrapped = False
+		for old, new in zip(old_values, values):
+			if new < old or reset:
+				delta = counter_delta(old, new, reset)
+				restarted = restarted or delta == new
+				wrapped = wrapped or delta != new
+			else:
+				delta = new - old
+			sample.append(delta)
+			rates.append(delta / span)
+		if restarted:
+			self.resets += 1
+		elif wrapped:
+			self.wraps += 1
+
+		slot = self.heads[row]
+		self.samples[row, slot] = sample
+		self.heads[row] = (slot + 1) % self.depth
+		if self.counts[row] < self.depth:
+			self.counts[row] += 1
+		return rates
+
+	def forget(self, key):
+		row = self.rows.pop(key, None)
+		if row is not None:
+			self.keys[row] = None
+			self.last[row] = None
+			self.counts[row] = 0
+			self.updated[row] = 0
+			self.free.append(row)
+
+	def forget_switch(self, dpid):
+		for key in [key for key in self.rows if key[0] == dpid]:
+			self.forget(key)
+
+	def _slots(self, row):
+		#Ring slots of a row, oldest first
+		count = self.counts[row]
+		return (self.heads[row] - count + np.arange(count)) % self.depth
+
+	def series(self, key, since=None, until=None):
+		#(times, rates[sample, field]) of the samples in [since, until]
+		row = self.rows.get(key)
+		if row is None:
+			return np.zeros(0), np.zeros((0, len(self.fields)))
+		samples = self.samples[row, self._slots(row)]
+		times = samples[:, 0]
+		first = 0 if since is None else np.searchsorted(times, since, 'left')
+		end = len(times) if until is None else np.searchsorted(times, until, 'right')
+		samples = samples[first:end]
+		return samples[:, 0], samples[:, 2:] / samples[:, 1, None]
+
+	def rate(self, key):
+		row = self.rows.get(key)
+		if row is None or not self.counts[row]:
+			return None
+		sample = self.samples[row, (self.heads[row] - 1) % self.depth]
+		return sample[2:] / sample[1]
+
+	def average(self, key, window):
+		#Moving average rate over the last `window` seconds of samples
+		row = self.rows.get(key)
+		if row is None or not self.counts[row]:
+			return None
+		samples = self.samples[row, self._slots(row)]
+		times = samples[:, 0]
+		first = np.searchsorted(times, times[-1] - window, 'right')
+		samples = samples[min(first, len(samples) - 1):]
+		return samples[:, 2:].sum(axis=0) / samples[:, 1].sum()
+
+	def rates(self, dpid=None):
+		#{key: latest rates} of every key (of one switch) with a sample
+		keys = [key for key, row in self.rows.items()
+			if (dpid is None or key[0] == dpid) and self.counts[row]]
+		if not keys:
+			return {}
+		rows = [self.rows[key] for key in keys]
+		slots = [(self.heads[row] - 1) % self.depth for row in rows]
+		samples = self.samples[rows, slots]
+		return dict(zip(keys, samples[:, 2:] / samples[:, 1, None]))
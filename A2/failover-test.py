@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Link-cut harness for the fast-failover groups in q1.py.
+#
+# Start the controller first with ROUTING_MODE = 'tree' and
+# FAST_FAILOVER = True:
+#
+#     ryu-manager --observe-links q1.py
+#     sudo python failover-test.py [src dst link_a link_b]
+#
+# The script brings up the q1-topo.py network, warms up the routes, then
+# runs a fast ping from src to dst, cuts link_a-link_b half way through
+# and reports how long the flow was blackholed (lost pings x interval).
+# The default h1 -> h8 path crosses s4-s5, which s4 can route around
+# through s6.
+#------------------------------------------------------------------------
+
+import importlib.util
+import os
+import re
+import sys
+import time
+
+from mininet.net import Mininet
+from mininet.node import RemoteController
+
+INTERVAL = 0.01
+COUNT = 1000
+
+
+def load_topo():
+	path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'q1-topo.py')
+	spec = importlib.util.spec_from_file_location('q1_topo', path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module.CustomTopo()
+
+
+def emulate(src='h1', dst='h8', link_a='s4', link_b='s5'):
+	net = Mininet(load_topo(), controller=RemoteController, autoStaticArp=True, autoSetMacs=True)
+
+	net.start()
+	time.sleep(5)
+
+	#The first pingall only teaches the controller where the hosts are
+	net.pingAll()
+	net.pingAll()
+
+	h_src = net.get(src)
+	h_dst = net.get(dst)
+	h_src.sendCmd('ping -i %s -c %d %s' % (INTERVAL, COUNT, h_dst.IP()))
+
+	time.sleep(INTERVAL * COUNT / 2)
+	print('>> cutting %s-%s' % (link_a, link_b))
+	net.configLinkStatus(link_a, link_b, 'down')
+
+	output = h_src.waitOutput()
+	net.stop()
+
+	stats = re.search(r'(\d+) packets transmitted, (\d+) received', output)
+	if stats is None:
+		print(output)
+		return
+
+	sent, received = int(stats.group(1)), int(stats.group(2))
+	print('%s -> %s: sent %d, received %d, lost %d' % (src, dst, sent,
+							received, sent - received))
+	print('loss window: %.1f ms' % ((sent - received) * INTERVAL * 1000))
+
+
+if __name__ == '__main__':
+	emulate(*sys.argv[1:])
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Idempotent FlowMod layer.
+#
+# Remembers the last state sent for every (dpid, table, priority, match)
+# and tells add_flow when a FlowMod would only repeat it, so bursts of
+# packet-ins for an already-programmed pair (or an already-dropped one)
+# stop re-sending identical FlowMods. The state of a flow has to be
+# forgotten whenever the switch may have lost it (cookie deletes, switch
+# reconnects, flow removals), otherwise a needed re-install would be
+# suppressed. That includes a FlowMod the switch refused: the xid of
+# every FlowMod sent is remembered (the last max_xids of them) so an
+# OFPErrorMsg can be traced back to the flow it was about.
+#------------------------------------------------------------------------
+
+from collections import OrderedDict
+
+
+def flow_key(dpid, table_id, priority, match):
+	return (dpid, table_id, priority, tuple(sorted(match.items())))
+
+
+def actions_key(actions):
+	return tuple(str(action) for action in actions)
+
+
+class InstallCache(object):
+
+	def __init__(self, max_xids=4096):
+		self.state = {}
+		self.by_cookie = {}
+		self.xids = OrderedDict()
+		self.max_xids = max_xids
+		self.sent = 0
+		self.suppressed = 0
+		self.failed = 0
+
+	def __contains__(self, key):
+		return key in self.state
+
+	def needs_install(self, key, value, cookie=0):
+		old = self.state.get(key)
+		if old == (cookie, value):
+			self.suppressed += 1
+			return False
+		if old is not None and old[0] in self.by_cookie:
+			self.by_cookie[old[0]].discard(key)
+		self.state[key] = (cookie, value)
+		self.by_cookie.setdefault(cookie, set()).add(key)
+		self.sent += 1
+		return True
+
+	def sent_as(self, dpid, xid, item):
+		#item: whatever the caller needs back if the message fails
+		self.xids[(dpid, xid)] = item
+		if len(self.xids) > self.max_xids:
+			self.xids.popitem(last=False)
+
+	def error(self, dpid, xid):
+		#The item sent with xid, or None if it is not (or no longer) known
+		item = self.xids.pop((dpid, xid), None)
+		if item is not None:
+			self.failed += 1
+		return item
+
+	def forget(self, key, cookie=None):
+		#With a cookie, only if the flow was not re-installed under another
+		#one since (a late FlowRemoved must not clear the new state)
+		old = self.state.get(key)
+		if old is None or (cookie is not None and old[0] != cookie):
+			return
+		del self.state[key]
+		if old[0] in self.by_cookie:
+			self.by_cookie[old[0]].discard(key)
+
+	def forget_cookie(self, cookie):
+		for key in self.by_cookie.pop(cookie, ()):
+			self.state.pop(key, None)
+
+	def forget_mac(self, mac):
+		#Flows whose match names mac, as eth_src or eth_dst
+		for key in [k for k in self.state if mac in (v for f, v in k[3])]:
+			self.forget(key)
+
+	def forget_switch(self, dpid):
+		for key in [k for k in self.state if k[0] == dpid]:
+			self.forget(key)
+		for sent in [x for x in self.xids if x[0] == dpid]:
+			del self.xids[sent]
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Ledger of the forwarding flows a controller has installed.
+#
+# Every routed unit (a host pair in 'pair' mode, a destination host in the
+# tree modes) gets its own cookie, which is stamped on all of its
+# FlowMods. The ledger remembers which switches carry the cookie and
+# which links the unit's path uses, so a link going down maps straight to
+# the cookies to delete (OFPFC_DELETE with a cookie mask) and the units
+# to reroute, without touching anything else. The same goes for a host
+# that moves: its cookies are the ones whose key names its MAC.
+#------------------------------------------------------------------------
+
+COOKIE_MASK = 0xffffffffffffffff
+
+# Set on the cookies of routing units ('pair' and 'tree'), so a flow stats
+# request can ask for routing rules only (cookie=ROUTE_COOKIE, same mask)
+ROUTE_COOKIE = 1 << 63
+
+
+class FlowEntry(object):
+
+	__slots__ = ('cookie', 'key', 'switches', 'links')
+
+	def __init__(self, cookie, key):
+		self.cookie = cookie
+		self.key = key
+		self.switches = set()
+		self.links = set()
+
+
+class FlowLedger(object):
+
+	def __init__(self):
+		self.next_cookie = 1
+		self.entries = {}
+		self.cookies = {}
+		self.by_link = {}
+		self.by_host = {}
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __contains__(self, key):
+		return key in self.cookies
+
+	def record(self, key, switches, links):
+		#Re-recording a key keeps its cookie and accumulates switches and
+		#links, so a later delete still reaches every switch it was sent to
+		cookie = self.cookies.get(key)
+		if cookie is None:
+			cookie = self.next_cookie
+			self.next_cookie += 1
+			if key[0] in ('pair', 'tree'):
+				cookie |= ROUTE_COOKIE
+			self.cookies[key] = cookie
+			self.entries[cookie] = FlowEntry(cookie, key)
+			for mac in key[1:]:
+				if mac is not None:
+					self.by_host.setdefault(mac, set()).add(cookie)
+		entry = self.entries[cookie]
+		entry.switches.update(switches)
+		for link in links:
+			if link not in entry.links:
+				entry.links.add(link)
+				self.by_link.setdefault(link, set()).add(cookie)
+		return cookie
+
+	def kind(self, cookie):
+		#'pair', 'tree' or 'drop'; 'static' for rules outside the ledger
+		entry = self.entries.get(cookie)
+		if entry is None:
+			return 'static'
+		return entry.key[0]
+
+	def affected(self, links):
+		cookies = set()
+		for link in links:
+			cookies.update(self.by_link.get(link, ()))
+		return [self.entries[c] for c in sorted(cookies)]
+
+	def for_host(self, mac):
+		return [self.entries[c] for c in sorted(self.by_host.get(mac, ()))]
+
+	def switch_gone(self, cookie, dpid):
+		#The unit's rule on dpid expired or was evicted; the whole unit is
+		#forgotten once no switch has it. Returns the entry if it was.
+		entry = self.entries.get(cookie)
+		if entry is None:
+			return None
+		entry.switches.discard(dpid)
+		if not entry.switches:
+			return self.forget(cookie)
+		return None
+
+	def forget(self, cookie):
+		entry = self.entries.pop(cookie)
+		del self.cookies[entry.key]
+		for link in entry.links:
+			users = self.by_link[link]
+			users.discard(cookie)
+			if not users:
+				del self.by_link[link]
+		for mac in entry.key[1:]:
+			users = self.by_host.get(mac)
+			if users is not None:
+				users.discard(cookie)
+				if not users:
+					del self.by_host[mac]
+		return entry
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Flow table lifecycle: timeouts, occupancy and LRU eviction.
+#
+# Reactive rules used to live forever, so a busy network filled the
+# switch tables. Every rule the controller installs now belongs to a
+# class with its own (idle_timeout, hard_timeout):
+#   static  table-miss, flood and ARP rules            permanent
+#   drop    firewall drops, pushed proactively         permanent
+#   pair    (eth_src, eth_dst) routes                  idle 30s
+#   tree    eth_dst routes shared by every source      idle 120s
+# Controller rules carry OFPFF_SEND_FLOW_REM, so expiries and deletes
+# come back as FlowRemoved and the controller forgets them. A proactive
+# controller, which pushes routes before any traffic needs them, installs
+# them with PROACTIVE_TIMEOUTS instead: an idle route would otherwise
+# expire and come back to the controller as a miss, and table space is
+# reclaimed by the eviction below.
+#
+# Occupancy per datapath is a running count: +1 for every new rule sent,
+# -1 for every FlowRemoved, re-synchronised from OFPTableStatsReply each
+# time the switch is polled. The table size comes from the switch's
+# table features, or a configured capacity if it does not report one.
+#
+# When a table passes high_water of its capacity, the controller asks for
+# its flow stats. Each reply is compared with the previous one: a flow
+# whose packet count went up was hit since. A flow in its first sample
+# has no previous count to compare with, so its age is its install time
+# (now - duration_sec) whether it has packets or not, which makes the
+# first eviction oldest-installed first rather than arbitrary. The least
+# recently hit evictable rules (pair and tree, never static or drop) are
+# deleted until the table is back at low_water.
+#------------------------------------------------------------------------
+
+import time
+
+TIMEOUTS = {
+	'static': (0, 0),
+	'drop': (0, 0),
+	'pair': (30, 0),
+	'tree': (120, 0),
+}
+
+PROACTIVE_TIMEOUTS = {
+	'pair': (0, 0),
+	'tree': (0, 0),
+}
+
+EVICTABLE = ('pair', 'tree')
+
+
+class FlowSample(object):
+
+	__slots__ = ('packets', 'last_hit', 'cookie', 'priority', 'match')
+
+	def __init__(self, packets, last_hit, cookie, priority, match):
+		self.packets = packets
+		self.last_hit = last_hit
+		self.cookie = cookie
+		self.priority = priority
+		self.match = match
+
+
+class FlowLifecycle(object):
+
+	def __init__(self, timeouts=None, capacity=None, high_water=0.9,
+				low_water=0.8, clock=time.time):
+		self.timeouts = dict(TIMEOUTS)
+		self.timeouts.update(timeouts or {})
+		self.default_capacity = capacity
+		self.high_water = high_water
+		self.low_water = low_water
+		self.clock = clock
+		self.active = {}
+		self.capacity = {}
+		self.samples = {}
+		self.evicting = {}
+
+		#metrics
+		self.expired = 0
+		self.evicted = 0
+
+	def timeouts_for(self, kind):
+		return self.timeouts.get(kind, (0, 0))
+
+	def added(self, dpid):
+		self.active[dpid] = self.active.get(dpid, 0) + 1
+
+	def removed(self, dpid, key, idle=False):
+		#An evicted rule was already taken off the count
+		evicting = self.evicting.get(dpid, set())
+		if key in evicting:
+			evicting.discard(key)
+		else:
+			self.active[dpid] = max(0, self.active.get(dpid, 0) - 1)
+		self.samples.get(dpid, {}).pop(key, None)
+		if idle:
+			self.expired += 1
+
+	def forget_switch(self, dpid):
+		self.active.pop(dpid, None)
+		self.samples.pop(dpid, None)
+		self.evicting.pop(dpid, None)
+
+	def table_stats(self, dpid, stats):
+		#OFPTableStatsReply body; the controller only uses table 0
+		for stat in stats:
+			if stat.table_id == 0:
+				self.active[dpid] = stat.active_count
+				self.evicting.pop(dpid, None)
+
+	def table_features(self, dpid, features):
+		for feature in features:
+			if feature.table_id == 0 and feature.max_entries:
+				self.capacity[dpid] = feature.max_entries
+
+	def limit(self, dpid):
+		return self.capacity.get(dpid, self.default_capacity)
+
+	def near_capacity(self, dpid):
+		limit = self.limit(dpid)
+		return bool(limit) and self.active.get(dpid, 0) >= self.high_water * limit
+
+	def flow_stats(self, dpid, stats, key_of, kind_of):
+		#Updates the hit times from an OFPFlowStatsReply body and returns the
+		#(cookie, priority, match, key) of the rules to evict, coldest first
+		now = self.clock()
+		seen = self.samples.setdefault(dpid, {})
+		current = {}
+		for stat in stats:
+			if stat.table_id != 0 or kind_of(stat.cookie) not in EVICTABLE:
+				continue
+			key = key_of(dpid, stat)
+			old = seen.get(key)
+			if old is None:
+				#Never sampled: its packets could be from any time since install
+				last_hit = now - stat.duration_sec
+			elif stat.packet_count != old.packets:
+				last_hit = now
+			else:
+				last_hit = old.last_hit
+			current[key] = FlowSample(stat.packet_count, last_hit, stat.cookie,
+							stat.priority, stat.match)
+		self.samples[dpid] = current
+
+		limit = self.limit(dpid)
+		if not limit or self.active.get(dpid, 0) < self.high_water * limit:
+			return []
+		excess = self.active[dpid] - int(self.low_water * limit)
+		coldest = sorted(current.items(), key=lambda item: item[1].last_hit)
+		victims = []
+		evicting = self.evicting.setdefault(dpid, set())
+		for key, sample in coldest[:excess]:
+			victims.append((sample.cookie, sample.priority, sample.match, key))
+			del current[key]
+			evicting.add(key)
+		self.active[dpid] -= len(victims)
+		self.evicted += len(victims)
+		return victims
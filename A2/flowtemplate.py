@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Pre-serialized FlowMod template for the routing hot path.
+#
+# Every pair rule the controller sends has the same shape: OFPFC_ADD in
+# table 0 at a fixed priority, an OXM match on eth_dst + eth_src and one
+# apply-actions instruction with a single output. Building that through
+# OFPMatch / OFPActionOutput / OFPInstructionActions / OFPFlowMod and
+# serializing it costs the same every time, so the template encodes the
+# OpenFlow 1.3 byte layout once and only patches the xid, cookie, the two
+# MACs and the output port into a reusable buffer. Encoded MACs are
+# cached, at most max_macs of them: when full, the MAC cached first goes,
+# so hosts coming and going cannot grow it without bound.
+#
+#   0  ofp_header + ofp_flow_mod body                   48 bytes
+#   48 ofp_match (OXM): eth_dst, eth_src                24 bytes
+#   72 ofp_instruction_actions (APPLY_ACTIONS)           8 bytes
+#   80 ofp_action_output                                16 bytes
+#------------------------------------------------------------------------
+
+import struct
+
+OFP_VERSION = 0x04
+OFPT_FLOW_MOD = 14
+OFPFC_ADD = 0
+OFP_NO_BUFFER = 0xffffffff
+OFPMT_OXM = 1
+OXM_OF_ETH_DST = 0x80000606
+OXM_OF_ETH_SRC = 0x80000806
+OFPIT_APPLY_ACTIONS = 4
+OFPAT_OUTPUT = 0
+OFPCML_MAX = 0xffe5
+
+FLOW_MOD_LEN = 96
+XID_OFFSET = 4
+COOKIE_OFFSET = 8
+ETH_DST_OFFSET = 56
+ETH_SRC_OFFSET = 66
+PORT_OFFSET = 84
+
+
+class FlowModTemplate(object):
+
+	def __init__(self, priority, table_id=0, idle_timeout=0, hard_timeout=0,
+				flags=0, max_macs=4096):
+		buf = bytearray(FLOW_MOD_LEN)
+		struct.pack_into('!BBHI', buf, 0, OFP_VERSION, OFPT_FLOW_MOD,
+						FLOW_MOD_LEN, 0)
+		struct.pack_into('!QQBBHHHIIIH2x', buf, 8, 0, 0, table_id, OFPFC_ADD,
+						idle_timeout, hard_timeout, priority, OFP_NO_BUFFER,
+						0, 0, flags)
+		struct.pack_into('!HHI6sI6s', buf, 48, OFPMT_OXM, 4 + 10 + 10,
+						OXM_OF_ETH_DST, b'\0' * 6, OXM_OF_ETH_SRC, b'\0' * 6)
+		struct.pack_into('!HH4x', buf, 72, OFPIT_APPLY_ACTIONS, 8 + 16)
+		struct.pack_into('!HHIH6x', buf, 80, OFPAT_OUTPUT, 16, 0, OFPCML_MAX)
+		self.buf = buf
+		self.macs = {}
+		self.max_macs = max_macs
+
+	def encode(self, xid, dst, src, port, cookie=0):
+		buf = self.buf
+		struct.pack_into('!I', buf, XID_OFFSET, xid)
+		struct.pack_into('!Q', buf, COOKIE_OFFSET, cookie)
+		buf[ETH_DST_OFFSET:ETH_DST_OFFSET + 6] = self._mac(dst)
+		buf[ETH_SRC_OFFSET:ETH_SRC_OFFSET + 6] = self._mac(src)
+		struct.pack_into('!I', buf, PORT_OFFSET, port)
+		return bytes(buf)
+
+	def _mac(self, mac):
+		raw = self.macs.get(mac)
+		if raw is None:
+			if len(self.macs) >= self.max_macs:
+				del self.macs[next(iter(self.macs))]
+			raw = self.macs[mac] = bytes(bytearray.fromhex(mac.replace(':', '')))
+		return raw
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Destination-based forwarding trees.
+#
+# Instead of one (eth_src, eth_dst) rule per switch for every host pair,
+# each switch gets a single eth_dst rule per destination that points at
+# its next hop on a shortest-path tree rooted at the destination switch.
+#------------------------------------------------------------------------
+
+from collections import deque
+
+
+def dest_tree(adj, root):
+	#Reverse BFS from the destination switch: {dpid: next hop dpid},
+	#the root itself maps to None (deliver to the host port)
+	radj = {}
+	for u in adj:
+		for v in adj[u]:
+			radj.setdefault(v, []).append(u)
+
+	tree = {root: None}
+	queue = deque([root])
+	while queue:
+		node = queue.popleft()
+		for prev in radj.get(node, ()):
+			if prev not in tree:
+				tree[prev] = node
+				queue.append(prev)
+	return tree
+
+
+def ecmp_next_hops(adj, root):
+	#All equal-cost next hops towards the destination switch:
+	#{dpid: [next hop dpids]}, the root itself maps to []
+	radj = {}
+	for u in adj:
+		for v in adj[u]:
+			radj.setdefault(v, []).append(u)
+
+	dist = {root: 0}
+	queue = deque([root])
+	while queue:
+		node = queue.popleft()
+		for prev in radj.get(node, ()):
+			if prev not in dist:
+				dist[prev] = dist[node] + 1
+				queue.append(prev)
+
+	hops = {}
+	for u, d in dist.items():
+		hops[u] = sorted(v for v in adj.get(u, ()) if dist.get(v) == d - 1)
+	return hops
+
+
+def backup_next_hops(adj, tree):
+	#Loop-free alternate for every switch on the tree: a neighbor other than
+	#its primary next hop whose own tree path to the root does not pass
+	#through the switch, so it avoids the primary link and cannot bounce
+	#the packet back. {dpid: backup next hop dpid}, switches without one
+	#are left out.
+	depth = {}
+
+	def depth_of(node):
+		chain = []
+		while node not in depth:
+			if tree[node] is None:
+				depth[node] = 0
+				break
+			chain.append(node)
+			node = tree[node]
+		for n in reversed(chain):
+			depth[n] = depth[tree[n]] + 1
+		return depth[chain[0]] if chain else depth[node]
+
+	def passes(node, via):
+		while node is not None:
+			if node == via:
+				return True
+			node = tree[node]
+		return False
+
+	backups = {}
+	for u, primary in tree.items():
+		if primary is None:
+			continue
+		best = None
+		for w in adj.get(u, ()):
+			if w == primary or w not in tree or passes(w, u):
+				continue
+			if best is None or (depth_of(w), w) < (depth_of(best), best):
+				best = w
+		if best is not None:
+			backups[u] = best
+	return backups
+
+
+def _first_hop(hops, node):
+	nxt = hops[node]
+	if isinstance(nxt, list):
+		return nxt[0] if nxt else None
+	return nxt
+
+
+def depth(hops, node):
+	#Hop count to the root in a dest_tree() or ecmp_next_hops() map
+	d = 0
+	node = _first_hop(hops, node)
+	while node is not None:
+		d += 1
+		node = _first_hop(hops, node)
+	return d
+
+
+def uses_link(hops, u, v):
+	nxt = hops.get(u)
+	if isinstance(nxt, list):
+		return v in nxt
+	return nxt is not None and nxt == v
+
+
+def improved_by(hops, u, v):
+	#Could a new link u -> v give u a shorter (or equal-cost) route?
+	if v not in hops:
+		return False
+	if u not in hops:
+		return True
+	return depth(hops, v) + 1 <= depth(hops, u)
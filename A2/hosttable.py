@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Host location table.
+#
+# Maps a host MAC to where it is attached: (dpid, edge port, last_seen).
+# It is kept apart from the switch topology, so host churn never touches
+# the link graph or the path cache, and a lookup is one dict access.
+#
+# learn() is called for every packet-in whose in_port is an edge port
+# (one with no switch on the other side). A host showing up at another
+# edge port than the recorded one has moved: the entry is re-homed and
+# learn() reports the move so the controller can rewrite that host's
+# rules, and only those. Controllers that keep no record of which rules
+# name a host delete them with delete_host_flows().
+#------------------------------------------------------------------------
+
+import time
+
+NEW = 1
+MOVED = 2
+
+
+class HostEntry(object):
+
+	__slots__ = ('dpid', 'port', 'last_seen')
+
+	def __init__(self, dpid, port, last_seen):
+		self.dpid = dpid
+		self.port = port
+		self.last_seen = last_seen
+
+
+class HostTable(object):
+
+	def __init__(self, clock=time.time):
+		self.clock = clock
+		self.entries = {}
+		self.by_switch = {}
+		self.moves = 0
+
+	def __contains__(self, mac):
+		return mac in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, mac):
+		return self.entries.get(mac)
+
+	def learn(self, mac, dpid, port):
+		#Returns NEW or MOVED when the host's location changed, None if not
+		now = self.clock()
+		entry = self.entries.get(mac)
+		if entry is None:
+			self.entries[mac] = HostEntry(dpid, port, now)
+			self.by_switch.setdefault(dpid, set()).add(mac)
+			return NEW
+
+		entry.last_seen = now
+		if entry.dpid == dpid and entry.port == port:
+			return None
+		if entry.dpid != dpid:
+			self._unlink(mac, entry.dpid)
+			self.by_switch.setdefault(dpid, set()).add(mac)
+		entry.dpid = dpid
+		entry.port = port
+		self.moves += 1
+		return MOVED
+
+	def switch(self, mac):
+		return self.entries[mac].dpid
+
+	def port(self, mac):
+		return self.entries[mac].port
+
+	def remove(self, mac):
+		entry = self.entries.pop(mac, None)
+		if entry is not None:
+			self._unlink(mac, entry.dpid)
+		return entry
+
+	def remove_switch(self, dpid):
+		#Hosts behind a switch that left the topology are forgotten with it
+		macs = self.by_switch.pop(dpid, set())
+		for mac in macs:
+			del self.entries[mac]
+		return sorted(macs)
+
+	def macs(self):
+		return list(self.entries)
+
+	def _unlink(self, mac, dpid):
+		macs = self.by_switch.get(dpid)
+		if macs is not None:
+			macs.discard(mac)
+			if not macs:
+				del self.by_switch[dpid]
+
+
+def delete_host_flows(datapaths, mac):
+	#Rules towards or from a host that moved, in every table of every switch
+	for datapath in datapaths:
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		for match in (parser.OFPMatch(eth_dst=mac), parser.OFPMatch(eth_src=mac)):
+			mod = parser.OFPFlowMod(datapath=datapath, table_id=ofproto.OFPTT_ALL,
+						command=ofproto.OFPFC_DELETE, out_port=ofproto.OFPP_ANY,
+						out_group=ofproto.OFPG_ANY, match=match)
+			datapath.send_msg(mod)
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Table-miss packet-in sizing.
+#
+# With OFPCML_NO_BUFFER the switch copies every missed frame in full to
+# the controller (up to 9500 bytes on jumbo-frame veths) and keeps no
+# copy itself. Given a miss_send_len, the switch is told to buffer the
+# frame and send only its first miss_send_len bytes plus a buffer_id,
+# which is all the handlers need: they read the Ethernet header and
+# release the packet with a PacketOut that names the buffer.
+#
+# A switch that reports n_buffers == 0 in its features reply cannot
+# buffer, so it keeps OFPCML_NO_BUFFER and full frames; packet-ins with
+# buffer_id == OFP_NO_BUFFER always carry the whole frame, which the
+# release paths already send back as PacketOut data.
+#
+# Messages go out through send(datapath, msg), by default the datapath's
+# own send_msg; a controller batching its sends (see sendqueue.py) passes
+# its queue's send so they keep their order with its FlowMods.
+#------------------------------------------------------------------------
+
+
+def send_msg(datapath, msg):
+	datapath.send_msg(msg)
+
+
+def miss_action(datapath, n_buffers, miss_send_len=None, send=send_msg):
+	#Configures the switch's miss_send_len and returns the output action
+	#for its table-miss rule
+	ofproto = datapath.ofproto
+	parser = datapath.ofproto_parser
+
+	max_len = ofproto.OFPCML_NO_BUFFER
+	if miss_send_len is not None and n_buffers:
+		max_len = miss_send_len
+
+	config = parser.OFPSetConfig(datapath, ofproto.OFPC_FRAG_NORMAL, max_len)
+	send(datapath, config)
+	return parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, max_len)
+
+
+#------------------------------------------------------------------------
+# Packet-in rate limiting.
+#
+# A table-miss rule sends whatever misses to the controller, so one host
+# scanning unknown addresses can flood it with packet-ins and starve LLDP,
+# echo and stats handling. With a rate set, the miss rules go through an
+# OpenFlow meter with a single DROP band: one meter for the whole switch,
+# or one per ingress port, so a single scanning port only exhausts its own
+# budget. Meters are only used once the switch's meter features show it
+# has them; until then (and on switches without meters) the miss rule
+# stays unmetered. The meters' band counters are polled and the packets
+# each one dropped are kept in drops.
+#
+# Port meters take the free ids 2..max_meter of their switch. Ports past
+# what the switch can meter, and ports whose meter the switch refused,
+# share the switch meter instead. The unmetered catch-all miss rule is
+# only deleted once a barrier sent after the port meters came back, i.e.
+# once any error about them has been seen.
+#------------------------------------------------------------------------
+
+MISS_METER = 1
+
+
+class MissMeters(object):
+
+	def __init__(self, rate, burst=0, per_port=False, send=send_msg):
+		#rate / burst in packets per second / packets
+		self.send = send
+		self.rate = rate
+		self.burst = burst
+		self.per_port = per_port
+		self.supported = {}
+		self.max_meter = {}
+		self.ports = {}
+		self.fences = {}
+		self.drops = {}
+
+	def request_features(self, datapath):
+		parser = datapath.ofproto_parser
+		self.send(datapath, parser.OFPMeterFeaturesStatsRequest(datapath, 0))
+
+	def features(self, datapath, body):
+		#OFPMeterFeaturesStatsReply body; True if the switch can meter
+		drop = 1 << datapath.ofproto.OFPMBT_DROP
+		ok = any(f.max_meter > 0 and f.band_types & drop for f in body)
+		self.supported[datapath.id] = ok
+		self.max_meter[datapath.id] = max([f.max_meter for f in body] or [0])
+		return ok
+
+	def forget_switch(self, dpid):
+		self.supported.pop(dpid, None)
+		self.max_meter.pop(dpid, None)
+		self.ports.pop(dpid, None)
+		self.fences.pop(dpid, None)
+		for key in [k for k in self.drops if k[0] == dpid]:
+			del self.drops[key]
+
+	def port_meter(self, dpid, port_no):
+		return self.ports.get(dpid, {}).get(port_no, MISS_METER)
+
+	def _free_id(self, dpid):
+		used = set(self.ports[dpid].values())
+		for meter_id in range(MISS_METER + 1, self.max_meter.get(dpid, 0) + 1):
+			if meter_id not in used:
+				return meter_id
+		return MISS_METER
+
+	def add_meter(self, datapath, meter_id):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		flags = ofproto.OFPMF_PKTPS
+		if self.burst:
+			flags |= ofproto.OFPMF_BURST
+		bands = [parser.OFPMeterBandDrop(rate=self.rate, burst_size=self.burst)]
+		#ADD fails on a meter left over from an earlier connection. Returns
+		#the ADD's xid, for its errors
+		self.send(datapath, parser.OFPMeterMod(datapath, ofproto.OFPMC_DELETE,
+							flags, meter_id, []))
+		req = parser.OFPMeterMod(datapath, ofproto.OFPMC_ADD, flags, meter_id, bands)
+		self.send(datapath, req)
+		return req.xid
+
+	def delete_meter(self, datapath, meter_id):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		self.send(datapath, parser.OFPMeterMod(datapath, ofproto.OFPMC_DELETE,
+							0, meter_id, []))
+		self.drops.pop((datapath.id, meter_id), None)
+
+	def sync_ports(self, datapath, ports):
+		#Per-port mode: one meter for every current port of the switch.
+		#Returns the (added, removed) port numbers and {xid: meter_id} of
+		#the meters added.
+		ports = set(p for p in ports if p <= datapath.ofproto.OFPP_MAX)
+		have = self.ports.setdefault(datapath.id, {})
+		added = sorted(ports - set(have))
+		removed = sorted(set(have) - ports)
+		for port_no in removed:
+			meter_id = have.pop(port_no)
+			if meter_id != MISS_METER:
+				self.delete_meter(datapath, meter_id)
+		xids = {}
+		for port_no in added:
+			meter_id = have[port_no] = self._free_id(datapath.id)
+			if meter_id != MISS_METER:
+				xids[self.add_meter(datapath, meter_id)] = meter_id
+		return added, removed, xids
+
+	def meter_failed(self, dpid, meter_id):
+		#The switch refused a port meter: its port falls back to the switch
+		#meter. Returns that port, or None.
+		for port_no, used in self.ports.get(dpid, {}).items():
+			if used == meter_id and meter_id != MISS_METER:
+				self.ports[dpid][port_no] = MISS_METER
+				return port_no
+		return None
+
+	def fence(self, dpid, xid):
+		#Barrier sent after dpid's port meters
+		self.fences[dpid] = xid
+
+	def fenced(self, dpid, xid):
+		#True when the barrier answered is the last one sent by fence()
+		if self.fences.get(dpid) != xid:
+			return False
+		del self.fences[dpid]
+		return True
+
+	def request_stats(self, datapath):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		self.send(datapath, parser.OFPMeterStatsRequest(datapath, 0, ofproto.OFPM_ALL))
+
+	def stats(self, dpid, body):
+		#OFPMeterStatsReply body; returns [(meter_id, packets dropped since
+		#the last reply)] for the meters that dropped any
+		dropped = []
+		for stat in body:
+			count = sum(band.packet_band_count for band in stat.band_stats)
+			key = (dpid, stat.meter_id)
+			if count > self.drops.get(key, 0):
+				dropped.append((stat.meter_id, count - self.drops.get(key, 0)))
+			self.drops[key] = count
+		return dropped
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Switch-level path cache.
+#
+# Paths are computed on a switch-only adjacency (hosts are never walked)
+# and keyed by (ingress dpid, egress dpid), so every host pair behind the
+# same two switches shares one entry. A reverse index from link to the
+# cached paths that use it lets topology changes drop only the entries
+# they actually affect.
+#------------------------------------------------------------------------
+
+from collections import deque
+
+
+def bfs_path(adj, src, dst):
+	if src == dst:
+		return [src]
+	prev = {src: None}
+	queue = deque([src])
+	while queue:
+		node = queue.popleft()
+		for nbr in adj.get(node, ()):
+			if nbr in prev:
+				continue
+			prev[nbr] = node
+			if nbr == dst:
+				path = [dst]
+				while prev[path[-1]] is not None:
+					path.append(prev[path[-1]])
+				path.reverse()
+				return path
+			queue.append(nbr)
+	return None
+
+
+class PathCache(object):
+
+	def __init__(self):
+		self.adj = {}
+		self.paths = {}
+		self.users = {}
+		self.hits = 0
+		self.misses = 0
+
+	def __contains__(self, key):
+		return key in self.paths
+
+	def links(self):
+		return [(u, v) for u in self.adj for v in self.adj[u]]
+
+	def get(self, src, dst):
+		key = (src, dst)
+		if key in self.paths:
+			self.hits += 1
+			return self.paths[key]
+
+		self.misses += 1
+		path = bfs_path(self.adj, src, dst)
+		self.put(src, dst, path)
+		return path
+
+	def put(self, src, dst, path):
+		#Stores a path computed elsewhere (e.g. by pathworker.PathWorkers)
+		#against the current adjacency
+		key = (src, dst)
+		self._drop(key)
+		self.paths[key] = path
+		if path is not None:
+			for link in zip(path, path[1:]):
+				self.users.setdefault(link, set()).add(key)
+
+	def add_switch(self, dpid):
+		self.adj.setdefault(dpid, set())
+
+	def add_link(self, u, v):
+		#Returns the switch pairs whose cached path was dropped
+		if v in self.adj.get(u, ()):
+			return []
+		# A new link can only shorten paths (or connect unreachable pairs)
+		# whose endpoints reach it: s -> u -> v -> d beats the cached length
+		if self.paths:
+			to_u = self._distances(u, reverse=True)
+			from_v = self._distances(v)
+			stale = []
+			for (s, d), path in self.paths.items():
+				if s not in to_u or d not in from_v:
+					continue
+				length = len(path) - 1 if path is not None else float('inf')
+				if to_u[s] + 1 + from_v[d] < length:
+					stale.append((s, d))
+			for key in stale:
+				self._drop(key)
+		else:
+			stale = []
+		self.adj.setdefault(u, set()).add(v)
+		self.adj.setdefault(v, set())
+		return stale
+
+	def remove_link(self, u, v):
+		if v not in self.adj.get(u, ()):
+			return
+		self.adj[u].discard(v)
+		for key in list(self.users.get((u, v), ())):
+			self._drop(key)
+		self.users.pop((u, v), None)
+
+	def remove_switch(self, dpid):
+		for v in list(self.adj.get(dpid, ())):
+			self.remove_link(dpid, v)
+		for u in list(self.adj):
+			if dpid in self.adj[u]:
+				self.remove_link(u, dpid)
+		self.adj.pop(dpid, None)
+		for key in [k for k in self.paths if dpid in k]:
+			self._drop(key)
+
+	def _drop(self, key):
+		path = self.paths.pop(key, None)
+		if path is None:
+			return
+		for link in zip(path, path[1:]):
+			keys = self.users.get(link)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self.users[link]
+
+	def _distances(self, root, reverse=False):
+		if reverse:
+			adj = {}
+			for u in self.adj:
+				for v in self.adj[u]:
+					adj.setdefault(v, []).append(u)
+		else:
+			adj = self.adj
+		dist = {root: 0}
+		queue = deque([root])
+		while queue:
+			node = queue.popleft()
+			for nbr in adj.get(node, ()):
+				if nbr not in dist:
+					dist[nbr] = dist[node] + 1
+					queue.append(nbr)
+		return dist
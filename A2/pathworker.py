@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Path computation off the event loop.
+#
+# Ryu runs every handler on one eventlet hub, so a path computed inline
+# in _packet_in_handler holds up LLDP, echo and stats processing for
+# every switch until it finishes. PathWorkers moves the computation into
+# a pool of worker processes:
+#
+#  - request() only records the (src dpid, dst dpid) pair and the item
+#    (e.g. the packet-in) waiting for it; requests for a pair already
+#    being computed join it.
+#  - flush(), called once per loop tick, sends every new pair as one job,
+#    together with an immutable snapshot of the switch adjacency. The
+#    snapshot is pickled once per topology version and handed over as
+#    bytes; each worker unpickles it once and keeps it for later jobs.
+#  - done() collects finished jobs, stores their paths in the PathCache
+#    and returns them with their waiting items. If the topology changed
+#    while a job ran, none of its paths is kept, since an added link may
+#    have made any of them longer than the shortest; its pairs are
+#    requested again against the new snapshot.
+#
+# Workers run one BFS per distinct source switch of a job, stopping once
+# all of that source's destinations are reached, so a burst of
+# packet-ins from one edge switch costs a single traversal.
+#
+# ryu-manager only has the app's directory on sys.path while it imports
+# the app, so every worker puts this directory back before it unpickles
+# its first job. If the pool breaks anyway (a worker died), it is
+# replaced; jobs that cannot be submitted are computed inline.
+#------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import pickle
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pathcache import bfs_path
+
+_snapshot = (None, None)
+
+#Run by each worker before its first job; a builtin, so the initializer
+#itself unpickles without this module on the path
+_WORKER_INIT = (exec, ('import sys; sys.path.insert(0, %r)'
+			% os.path.dirname(os.path.abspath(__file__)),))
+
+
+def solve(version, blob, pairs):
+	#Runs in a worker: {(src, dst): path or None} for every requested pair
+	global _snapshot
+	if _snapshot[0] != version:
+		_snapshot = (version, pickle.loads(blob))
+	adj = _snapshot[1]
+
+	by_src = {}
+	for (src, dst) in pairs:
+		by_src.setdefault(src, []).append(dst)
+
+	paths = {}
+	for src, dsts in by_src.items():
+		prev = {src: None}
+		left = set(dsts)
+		left.discard(src)
+		queue = deque([src])
+		while queue and left:
+			node = queue.popleft()
+			for nbr in adj.get(node, ()):
+				if nbr not in prev:
+					prev[nbr] = node
+					queue.append(nbr)
+					left.discard(nbr)
+		for dst in dsts:
+			if dst not in prev:
+				paths[(src, dst)] = None
+				continue
+			path = [dst]
+			while prev[path[-1]] is not None:
+				path.append(prev[path[-1]])
+			path.reverse()
+			paths[(src, dst)] = path
+	return paths
+
+
+class PathJob(object):
+
+	__slots__ = ('future', 'version', 'waiting', 'executor')
+
+	def __init__(self, future, version, waiting, executor):
+		self.future = future
+		self.version = version
+		self.waiting = waiting
+		self.executor = executor
+
+
+class PathWorkers(object):
+
+	def __init__(self, paths, workers=2, executor=None):
+		self.workers = workers
+		self.own_executor = executor is None
+		self.executor = executor if executor is not None else self._new_executor()
+		self.paths = paths
+		self.version = 0
+		self.blob = None
+		self.batch = {}
+		self.jobs = []
+		self.running = {}
+
+		#metrics
+		self.requested = 0
+		self.submitted = 0
+		self.resubmitted = 0
+		self.restarts = 0
+		self.inline = 0
+
+	def _new_executor(self):
+		#forkserver: workers do not inherit the controller's hub state
+		context = multiprocessing.get_context('forkserver')
+		initializer, initargs = _WORKER_INIT
+		return ProcessPoolExecutor(self.workers, mp_context=context,
+					initializer=initializer, initargs=initargs)
+
+	def _restart(self):
+		#Replaces a broken pool; False if it is not ours to replace
+		if not self.own_executor:
+			return False
+		self.executor.shutdown(wait=False)
+		self.executor = self._new_executor()
+		self.restarts += 1
+		return True
+
+	def _submit(self, pairs):
+		try:
+			return self.executor.submit(solve, self.version, self.blob, pairs)
+		except BrokenProcessPool:
+			if self._restart():
+				try:
+					return self.executor.submit(solve, self.version, self.blob, pairs)
+				except BrokenProcessPool:
+					pass
+		#No pool to run it: an already finished job computed here
+		self.inline += 1
+		future = Future()
+		future.set_result(dict((key, bfs_path(self.paths.adj, key[0], key[1]))
+						for key in pairs))
+		return future
+
+	def __len__(self):
+		return len(self.batch) + len(self.running)
+
+	def invalidate(self):
+		#The topology changed: later jobs get a new snapshot and the pairs
+		#of the running ones are requested again when they finish
+		self.version += 1
+		self.blob = None
+
+	def request(self, key, item):
+		self.requested += 1
+		job = self.running.get(key)
+		if job is not None:
+			job.waiting[key].append(item)
+		else:
+			self.batch.setdefault(key, []).append(item)
+
+	def flush(self):
+		if not self.batch:
+			return
+		if self.blob is None:
+			snapshot = dict((u, tuple(v)) for u, v in self.paths.adj.items())
+			self.blob = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+		waiting, self.batch = self.batch, {}
+		future = self._submit(list(waiting))
+		job = PathJob(future, self.version, waiting, self.executor)
+		self.jobs.append(job)
+		for key in waiting:
+			self.running[key] = job
+		self.submitted += 1
+
+	def done(self):
+		#[(key, path, items)] for every finished, still valid request
+		results = []
+		if not self.jobs:
+			return results
+		pending = []
+		for job in self.jobs:
+			if not job.future.done():
+				pending.append(job)
+				continue
+			for key in job.waiting:
+				del self.running[key]
+			try:
+				paths = job.future.result()
+			except Exception as e:
+				#A failed job must not strand its packets: compute them here,
+				#and replace the pool if it is what failed (once, not per job)
+				if isinstance(e, BrokenProcessPool) and job.executor is self.executor:
+					self._restart()
+				self.inline += 1
+				paths = dict((key, bfs_path(self.paths.adj, key[0], key[1]))
+						for key in job.waiting)
+			stale = job.version != self.version
+			for key, items in job.waiting.items():
+				if stale:
+					self.resubmitted += 1
+					self.batch.setdefault(key, []).extend(items)
+					continue
+				path = paths[key]
+				self.paths.put(key[0], key[1], path)
+				results.append((key, path, items))
+		self.jobs = pending
+		return results
+
+	def shutdown(self, wait=True):
+		self.executor.shutdown(wait=wait)
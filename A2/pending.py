@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# In-flight flow setups.
+#
+# Once the FlowMods for a (src, dst) pair have been sent, the controller
+# fences every switch it touched with an OFPBarrierRequest. Until all of
+# those barriers are answered the setup is in flight, and further
+# packet-ins of that flow are queued here instead of being routed again.
+# When the last barrier reply arrives, the queued packets are handed back
+# so they can be released into the now-programmed pipeline.
+#
+# An error from a switch before its barrier reply means some rule of a
+# setup fenced there may be missing; those setups are dropped with their
+# queued packets, which would only miss again.
+#
+# A setup whose barriers never come back (e.g. the switch went away)
+# expires after `timeout` seconds and the flow is routed from scratch.
+#------------------------------------------------------------------------
+
+import time
+
+
+class PendingSetup(object):
+
+	__slots__ = ('key', 'barriers', 'queued', 'started')
+
+	def __init__(self, key, barriers, started):
+		self.key = key
+		self.barriers = set(barriers)
+		self.queued = []
+		self.started = started
+
+
+class PendingSetups(object):
+
+	def __init__(self, timeout=1.0, max_queued=32, clock=time.time):
+		self.timeout = timeout
+		self.max_queued = max_queued
+		self.clock = clock
+		self.flows = {}
+		self.xids = {}
+		self.coalesced = 0
+		self.dropped = 0
+		self.expired = 0
+
+	def __len__(self):
+		return len(self.flows)
+
+	def start(self, key, barriers):
+		#barriers: (dpid, xid) of every barrier fencing this setup
+		self._drop(key)
+		setup = PendingSetup(key, barriers, self.clock())
+		self.flows[key] = setup
+		for barrier in setup.barriers:
+			self.xids[barrier] = key
+		return setup
+
+	def queue(self, key, item):
+		#True if the flow is in flight and item was absorbed (queued or,
+		#when the queue is full, dropped)
+		setup = self.flows.get(key)
+		if setup is None:
+			return False
+		if self.clock() - setup.started > self.timeout:
+			self.expired += 1
+			self._drop(key)
+			return False
+		self.coalesced += 1
+		if len(setup.queued) < self.max_queued:
+			setup.queued.append(item)
+		else:
+			self.dropped += 1
+		return True
+
+	def complete(self, dpid, xid):
+		#Returns the finished setup once its last barrier is answered
+		key = self.xids.pop((dpid, xid), None)
+		if key is None:
+			return None
+		setup = self.flows[key]
+		setup.barriers.discard((dpid, xid))
+		if setup.barriers:
+			return None
+		del self.flows[key]
+		return setup
+
+	def fail(self, dpid):
+		#Setups still waiting for a barrier of dpid
+		for key in set(key for (d, x), key in self.xids.items() if d == dpid):
+			self.dropped += len(self.flows[key].queued)
+			self._drop(key)
+
+	def _drop(self, key):
+		setup = self.flows.pop(key, None)
+		if setup is not None:
+			for barrier in setup.barriers:
+				self.xids.pop(barrier, None)
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Lazy header view for packet-in data.
+#
+# packet.Packet(msg.data) decodes every protocol in the frame into an
+# object graph, while the handlers only read a couple of header fields.
+# PacketView keeps a memoryview of msg.data and decodes a field only when
+# it is asked for, at its fixed offset:
+#
+#    0 eth dst, 6 eth src, 12 ethertype (after at most one 802.1Q tag)
+#   l3 +  9 IPv4 protocol, l3 + 12/16 IPv4 src/dst
+#   l4 +  0/2 TCP/UDP src/dst port, l4 = l3 + IHL * 4
+#
+# Anything the fast path does not cover (IPv6, stacked VLAN tags, IPv4
+# fragments, frames cut short by miss_send_len) is answered from the full
+# Ryu parse, built at most once per packet.
+#------------------------------------------------------------------------
+
+import struct
+
+from ryu.lib.packet import packet, ethernet, ipv4, tcp
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_8021Q = 0x8100
+ETH_TYPE_8021AD = 0x88a8
+ETH_TYPE_IPV6 = 0x86dd
+IPPROTO_TCP = 6
+
+_unpack_H = struct.Struct('!H').unpack_from
+
+
+class PacketView(object):
+
+	__slots__ = ('data', 'view', '_l3', '_pkt')
+
+	def __init__(self, data):
+		self.data = data
+		self.view = memoryview(data)
+		self._l3 = None
+		self._pkt = None
+
+	@property
+	def dst(self):
+		if len(self.view) < 14:
+			return self._eth().dst
+		return self.view[0:6].hex(':')
+
+	@property
+	def src(self):
+		if len(self.view) < 14:
+			return self._eth().src
+		return self.view[6:12].hex(':')
+
+	@property
+	def ethertype(self):
+		l3 = self._l3_offset()
+		if l3 is None:
+			return self._eth().ethertype
+		return _unpack_H(self.view, l3 - 2)[0]
+
+	@property
+	def ip_proto(self):
+		l4 = self._l4_offset()
+		if l4 is None:
+			return None
+		if l4 < 0:
+			ip = self.packet().get_protocol(ipv4.ipv4)
+			return ip.proto if ip is not None else None
+		return self.view[self._l3 + 9]
+
+	@property
+	def tcp_dst(self):
+		l4 = self._l4_offset()
+		if l4 is None:
+			return None
+		if l4 < 0:
+			info = self.packet().get_protocol(tcp.tcp)
+			return info.dst_port if info is not None else None
+		if self.view[self._l3 + 9] != IPPROTO_TCP:
+			return None
+		return _unpack_H(self.view, l4 + 2)[0]
+
+	def packet(self):
+		#Full Ryu parse, for fields and frames the fast path does not cover
+		if self._pkt is None:
+			self._pkt = packet.Packet(self.data)
+		return self._pkt
+
+	def _eth(self):
+		return self.packet().get_protocol(ethernet.ethernet)
+
+	def _l3_offset(self):
+		if self._l3 is None:
+			view = self.view
+			if len(view) < 14:
+				return None
+			l3 = 14
+			if _unpack_H(view, 12)[0] == ETH_TYPE_8021Q:
+				if len(view) < 18:
+					return None
+				l3 = 18
+			self._l3 = l3
+		return self._l3
+
+	def _l4_offset(self):
+		#Start of the IPv4 payload; None when the frame has no IPv4 header
+		#(ARP, LLDP, ...) and -1 when the fast path cannot tell
+		l3 = self._l3_offset()
+		if l3 is None:
+			return -1
+		view = self.view
+		ethertype = _unpack_H(view, l3 - 2)[0]
+		if ethertype != ETH_TYPE_IP:
+			if ethertype in (ETH_TYPE_IPV6, ETH_TYPE_8021Q, ETH_TYPE_8021AD):
+				return -1
+			return None
+		if len(view) < l3 + 20 or view[l3] >> 4 != 4:
+			return -1
+		#non-first fragments carry no transport header
+		if _unpack_H(view, l3 + 6)[0] & 0x1fff:
+			return -1
+		l4 = l3 + (view[l3] & 0x0f) * 4
+		if len(view) < l4 + 4:
+			return -1
+		return l4
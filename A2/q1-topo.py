@@ -1,5 +1,7 @@
 #!/usr/bin/python
 
+import sys
+
 from mininet.net import Mininet
 from mininet.topo import Topo
 from mininet.cli import CLI
@@ -25,9 +27,11 @@ class CustomTopo(Topo):
 			self.addLink(switchList[edge[0]-1], switchList[edge[1]-1])
 
 
-def emulate():
+def emulate(staticArp=True):
+	#With --no-static-arp the hosts resolve each other through the
+	#controller's ARP proxy (q1.py) instead of preloaded ARP tables
 	myTopo = CustomTopo()
-	net = Mininet(myTopo, controller=RemoteController, autoStaticArp=True, autoSetMacs=True)
+	net = Mininet(myTopo, controller=RemoteController, autoStaticArp=staticArp, autoSetMacs=True)
 
 	net.start()
 	CLI(net)
@@ -35,4 +39,4 @@ def emulate():
 
 
 if __name__ == '__main__':
-	emulate()
+	emulate('--no-static-arp' not in sys.argv)
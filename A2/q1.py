@@ -6,36 +6,210 @@ from ryu.controller.handler import set_ev_cls
 from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
 from ryu.controller import ofp_event
 
-from ryu.topology import event, switches
-from ryu.topology.api import get_switch, get_link
+from ryu.lib.packet import ether_types, arp
+from ryu.lib import hub
 
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
+import time
 
-import networkx as nx
+from topocore import Topology
+from hosttable import HostTable, MOVED
+from arpproxy import ArpProxy
+from pathcache import PathCache
+from pathworker import PathWorkers
+from spantree import SpanningTree
+from pktview import PacketView
+from missconfig import miss_action, MissMeters, MISS_METER
+from topoevents import TopologyEvents
+from fwdtree import dest_tree, ecmp_next_hops, backup_next_hops
+from fwdtree import uses_link, improved_by
+from flowledger import FlowLedger, COOKIE_MASK, ROUTE_COOKIE
+from flowcache import InstallCache, flow_key, actions_key
+from pending import PendingSetups
+from sendqueue import SendQueue
+from flowtemplate import FlowModTemplate
+from fwpolicy import odd_even
+from flowlife import FlowLifecycle, PROACTIVE_TIMEOUTS
+from statspoll import StatsPoller
 
-class Controller1(app_manager.RyuApp):
+# Group id of every switch's flood group (the per-destination FF/SELECT
+# groups are numbered from 1 on each switch, see group_for)
+FLOOD_GROUP = 0xfffff000
+
+
+class Controller1(TopologyEvents, app_manager.RyuApp):
 
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+	# 'pair': one (eth_src, eth_dst) rule per switch on every host pair's path
+	# 'tree': one eth_dst rule per (switch, destination) on a shortest-path
+	#         tree rooted at the destination's switch
+	# 'ecmp': like 'tree', but switches with several equal-cost next hops
+	#         spread traffic over them through an OFPGT_SELECT group
+	ROUTING_MODE = 'pair'
+
+	# 'tree' mode only: back every tree rule with a loop-free alternate next
+	# hop in an OFPGT_FF group, so a link cut fails over in the data plane
+	FAST_FAILOVER = False
+
+	# Install forwarding rules for every known host pair as soon as a host is
+	# learned, instead of waiting for its flows to miss
+	PROACTIVE = False
+
+	# Host firewall (see fwpolicy.py); its drops are pushed into table 0 as
+	# hosts are learned, so denied traffic never reaches the controller
+	FIREWALL = odd_even()
+
+	# Flow table lifecycle (see flowlife.py): idle / hard timeouts per rule
+	# class (overrides of flowlife.TIMEOUTS, or of PROACTIVE_TIMEOUTS in
+	# proactive mode) and LRU eviction of routing
+	# rules near the table size. TABLE_CAPACITY is used for switches that
+	# do not report one; occupancy is re-read about every TABLE_STATS_INTERVAL
+	# s, more often while it changes (see statspoll.py). A flow stats request
+	# for eviction whose reply has not come within FLOW_STATS_TIMEOUT s is
+	# given up and sent again.
+	FLOW_TIMEOUTS = {}
+	TABLE_CAPACITY = 10000
+	TABLE_STATS_INTERVAL = 10
+	FLOW_STATS_TIMEOUT = 10
+
+	# Bytes of a table-miss frame sent to the controller; the switch buffers
+	# the rest (see missconfig.py). None sends whole frames unbuffered.
+	MISS_SEND_LEN = None
+
+	# Packet-in rate limit (see missconfig.py): packets per second a switch,
+	# or with MISS_METER_PER_PORT each of its ingress ports, may send to the
+	# controller through the table-miss rule. None leaves it unlimited.
+	MISS_METER_RATE = None
+	MISS_METER_BURST = 0
+	MISS_METER_PER_PORT = False
+
+	# 'pair' mode only: compute path cache misses in PATH_WORKERS worker
+	# processes instead of on the event loop; the packet-in waits for them
+	OFFLOAD_PATHS = False
+	PATH_WORKERS = 2
+
 	def __init__(self, *args, **kwargs):
 		super(Controller1, self).__init__(*args, **kwargs)
 		self.topology_api_app = self
-		self.net = nx.DiGraph()
+		self.net = Topology()
+		self.paths = PathCache()
+		self.hosts = HostTable()
+		self.arp = ArpProxy(self.hosts)
 		self.switches = {}
+		self.trees = {}
+		self.routed = set()
+		self.groups = {}
+		self.group_ids = {}
+		self.backups = {}
+		self.flood_tree = SpanningTree()
+		self.flooding = {}
+		self.settling = set()
+		self.ledger = FlowLedger()
+		self.installed = InstallCache()
+		self.pending = PendingSetups()
+		self.touched = {}
+		self.out = SendQueue()
+		self.templates = {}
+		timeouts = dict(PROACTIVE_TIMEOUTS if self.PROACTIVE else {})
+		timeouts.update(self.FLOW_TIMEOUTS)
+		self.lifecycle = FlowLifecycle(timeouts, self.TABLE_CAPACITY)
+		self.flow_stats = {}
+		self.poller = StatsPoller(None, self.TABLE_STATS_INTERVAL)
+		self.table_thread = hub.spawn(self._table_monitor)
+
+		self.meters = None
+		self.miss_actions = {}
+		if self.MISS_METER_RATE:
+			self.meters = MissMeters(self.MISS_METER_RATE, self.MISS_METER_BURST,
+							self.MISS_METER_PER_PORT, self.out.send)
+
+		self.workers = None
+		if self.OFFLOAD_PATHS:
+			self.workers = PathWorkers(self.paths, self.PATH_WORKERS)
+			self.path_event = hub.Event()
+			self.path_thread = hub.spawn(self._path_collector)
 
 		
-	@set_ev_cls(event.EventSwitchEnter)
-	def get_topology_data(self, ev):
-		switch_list = get_switch(self.topology_api_app, None)
-		switches = [switch.dp.id for switch in switch_list]
-		self.net.add_nodes_from(switches)
+	def topology_changed(self, changes):
+		#Only the trees crossing a removed link, or that an added link could
+		#shorten or give a fast-failover backup, are dropped. The first are rerouted below through the
+		#ledger; the second are pushed again right away, since their old
+		#rules keep matching and no packet-in would ever rebuild them.
+		if self.workers is not None:
+			self.workers.invalidate()
+
+		stale = set()
+		improved = set()
+		for dst_id, hops in self.trees.items():
+			backups = self.backups.get(dst_id, {})
+			for (u, v) in changes.links_removed:
+				if uses_link(hops, u, v) or backups.get(u) == v:
+					stale.add(dst_id)
+			for (u, v) in changes.links_added:
+				if improved_by(hops, u, v):
+					improved.add(dst_id)
+			#A link back after a flap rarely shortens a tree, but it can give
+			#switches the backup they lost with it
+			if (self.FAST_FAILOVER and self.ROUTING_MODE == 'tree'
+					and changes.links_added and dst_id not in improved):
+				gained = backup_next_hops(self.paths.adj, hops)
+				if set(gained) - set(backups):
+					improved.add(dst_id)
+		stale.update(changes.switches_removed)
+		stale |= improved
+
+		for dst_id in stale:
+			self.trees.pop(dst_id, None)
+			self.backups.pop(dst_id, None)
+		shortened = [mac for mac in self.routed
+				if mac in self.hosts and self.hosts.switch(mac) in improved]
+		self.routed = set(mac for mac in self.routed
+				if mac in self.hosts and self.hosts.switch(mac) not in stale)
+
+		#Flows crossing a removed link are deleted by cookie and only those
+		#host pairs (or destinations) are rerouted
+		for entry in self.ledger.affected(changes.links_removed):
+			self.ledger.forget(entry.cookie)
+			self.delete_flows(entry.cookie, entry.switches)
+			kind, src, dst = entry.key
+			if dst not in self.hosts:
+				continue
+			if kind == 'pair':
+				if src in self.hosts:
+					self.route_pair(src, dst)
+			else:
+				self.routed.discard(dst)
+				self.route_pair(None, dst)
+
+		for dst in shortened:
+			self.route_pair(None, dst)
 
-		link_list = get_link(self.topology_api_app, None)
+		#Proactive mode: only the host pairs an added link shortened (or
+		#connected) are pushed again, not every pair
+		if self.PROACTIVE and self.ROUTING_MODE == 'pair':
+			self.reinstall_pairs(changes.paths_changed)
 
-		for link in link_list:
-			self.net.add_edge(link.src.dpid, link.dst.dpid, port=link.src.port_no)
-			self.net.add_edge(link.dst.dpid, link.src.dpid, port=link.dst.port_no)
+		#Flood groups follow the spanning tree, and a link also changes the
+		#edge ports of its endpoints. A link joins the tree only once both of
+		#its directions are known.
+		flood = set(changes.ports_changed)
+		for dpid in changes.switches_added:
+			self.flood_tree.add_switch(dpid)
+			flood.add(dpid)
+		for dpid in changes.switches_removed:
+			flood |= self.flood_tree.remove_switch(dpid)
+			self.poller.remove(dpid)
+		for (u, v) in changes.links_removed:
+			flood |= self.flood_tree.remove_link(u, v)
+			flood.update((u, v))
+		for (u, v) in changes.links_added:
+			if self.net.has_link(v, u):
+				flood |= self.flood_tree.add_link(u, v)
+			flood.update((u, v))
+		self.update_flood(flood)
+
+		if self.meters is not None and self.meters.per_port:
+			self.meter_ports(set(changes.ports_changed) | set(changes.switches_added))
 
 
 	@set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -47,11 +221,47 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto	
 		parser = datapath.ofproto_parser
 
+		#A (re)connecting switch may have lost whatever we installed before
+		self.installed.forget_switch(datapath.id)
+		self.lifecycle.forget_switch(datapath.id)
+		self.flow_stats.pop(datapath.id, None)
+		self.poller.add(datapath)
+		self.out.forget(datapath.id)
+
 		#Add default rule
 		match = parser.OFPMatch()	
-		actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-						  				  ofproto.OFPCML_NO_BUFFER)]
+		actions = [miss_action(datapath, ev.msg.n_buffers, self.MISS_SEND_LEN,
+						self.out.send)]
 		self.add_flow(datapath, priority, match, actions)
+		self.miss_actions[datapath.id] = actions
+
+		#The miss rules are metered once the switch shows it has meters
+		if self.meters is not None:
+			self.meters.forget_switch(datapath.id)
+			self.meters.request_features(datapath)
+
+		#Broadcast and multicast frames are flooded by the switch along the
+		#spanning tree; ARP broadcasts still go to the controller's ARP proxy
+		#Groups left from before are deleted all at once and numbered again
+		self.flooding.pop(datapath.id, None)
+		for key in [key for key in self.groups if key[0] == datapath.id]:
+			del self.groups[key]
+		self.group_ids.pop(datapath.id, None)
+		self.add_group(datapath, ofproto.OFPG_ALL, [], ofproto.OFPGT_ALL, ofproto.OFPGC_DELETE)
+		self.update_flood([datapath.id])
+
+		#Firewall drops of the hosts already known behind this switch
+		self.install_drops(self.FIREWALL.drops_for_switch(datapath.id, self.hosts))
+
+		match = parser.OFPMatch(eth_dst=('01:00:00:00:00:00', '01:00:00:00:00:00'))
+		self.add_flow(datapath, 1, match, [parser.OFPActionGroup(FLOOD_GROUP)])
+		match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_ARP,
+					eth_dst='ff:ff:ff:ff:ff:ff')
+		self.add_flow(datapath, 2, match, actions)
+
+		#The table size, for the eviction threshold
+		req = parser.OFPTableFeaturesStatsRequest(datapath, 0, [])
+		self.out.send(datapath, req)
 
 
 	@set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
@@ -61,70 +271,704 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		pkt = packet.Packet(msg.data)
-		eth = pkt.get_protocol(ethernet.ethernet)
+		pkt = PacketView(msg.data)
+
+		if pkt.ethertype == ether_types.ETH_TYPE_LLDP:
+			return
 
 		dpid = datapath.id
-		src = eth.src
-		dst = eth.dst
-
-		if src not in self.net:
-			self.net.add_node(src)
-			self.net.add_edge(dpid,src,port=ofproto.OFPXMT_OFB_IN_PHY_PORT)
-			self.net.add_edge(src,dpid)
-
-		if dst in self.net:
-			src_id = list(self.net[src].keys())[0]
-			dst_id = list(self.net[dst].keys())[0]
-
-			# NOTE : As it was mentioned that we do not need to send the packet out
-			# therefore when we do the pingall for the first time it sets up all the routes 
-			# but the pingall itself (for the first time) does not work. Once all the 
-			# routes are setup and we run pingall again, everything works as intented.
-
-			if nx.has_path(self.net, src, dst):
-				#-----------------------------------------------------------
-				# STEP 1: - compute shortest path between src and dst
-				#-----------------------------------------------------------
-				path = nx.shortest_path(self.net, src, dst)[1:-1]
-				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
-
-				#------------------------------------------------------------------------
-				# STEP 2: - install a routing rule for every switch in the path
-				#------------------------------------------------------------------------
-			
-				for switch_id in path:
-					idx =  path.index(switch_id)
-					priority= 1
-					datapath_curr = self.switches[switch_id]
-					if  idx == len(path)-1:
-						port = self.net[switch_id][dst]['port']
-					else:
-						port = self.net[switch_id][path[idx+1]]['port']
-					actions = [parser.OFPActionOutput(port)]
-					self.add_flow(datapath_curr, priority, match, actions)
+		src = pkt.src
+		dst = pkt.dst
+		in_port = msg.match['in_port']
+
+		#Hosts are only learned on edge ports: a packet-in from an inter-switch
+		#port says nothing about where its source is attached
+		if self.net.may_host(dpid, in_port):
+			change = self.hosts.learn(src, dpid, in_port)
+			if change == MOVED:
+				self.rehome(src)
+			if change is not None:
+				self.install_drops(self.FIREWALL.drops_for_host(src, self.hosts))
+				#Its port is flooded to from now on
+				self.net.host_seen(dpid, in_port)
+				if in_port not in self.flooding.get(dpid, ()):
+					self.update_flood([dpid])
+
 			#------------------------------------------------------------------------
-			# STEP 3: - install a firewall rule in the ingress switch (i.e., 
-			#                first switch in the path), if needed
+			# Proactive mode: push rules between the new host and every known host
+			# right away, so later flows between them never reach the controller
 			#------------------------------------------------------------------------
-			if not((src_id%2 and dst_id%2) or not(src_id% 2 or dst_id%2)):
-				actions = []
-				priority= 2
-				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
-				self.add_flow(datapath, priority, match, actions)
+			if change is not None and self.PROACTIVE:
+				for host in self.hosts.macs():
+					if host != src:
+						self.route_pair(src, host)
+						self.route_pair(host, src)
+		if src not in self.hosts:
+			return
+
+		if pkt.ethertype == ether_types.ETH_TYPE_ARP:
+			if self.answer_arp(datapath, in_port, pkt):
+				return
+
+		#Unknown unicast from a host goes to every edge port; a buffered frame
+		#is only on its ingress switch and cannot be copied to the others
+		entry = self.hosts.get(src)
+		if dst not in self.hosts and (entry.dpid, entry.port) == (dpid, in_port):
+			if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+				self.flood_edges(datapath, in_port, msg.data)
+			return
+
+		# NOTE : Rules are programmed from the egress switch back to the ingress and
+		# fenced with barriers; the packet that triggered the setup is held until every
+		# barrier is answered and then released once, at the switch it came from, so
+		# the first pingall no longer loses its first packets.
+		# In proactive mode the pair was routed when its hosts were learned; a
+		# packet-in then means its rules expired or were evicted since.
+		if dst in self.hosts:
+			#Packets of a flow whose rules are still being applied are held
+			#until its barriers come back instead of being routed again
+			if self.pending.queue((src, dst), msg):
+				return
+
+			#A path cache miss goes to the worker pool; the packet-in is routed
+			#by _path_collector once its switch pair's path is back
+			if self.workers is not None and self.ROUTING_MODE == 'pair':
+				key = (self.hosts.switch(src), self.hosts.switch(dst))
+				if key not in self.paths:
+					self.workers.request(key, (src, dst, msg))
+					self.path_event.set()
+					return
+			self.setup_flow(src, dst, msg)
+
+	def answer_arp(self, datapath, in_port, pkt):
+		#ARP requests are answered here, out of the port they came in on, and
+		#never forwarded; other ARP packets are routed like any unicast frame
+		request = pkt.packet().get_protocol(arp.arp)
+		if request is None:
+			return False
+		data = self.arp.handle(request)
+		if data is not None:
+			self.send_packet(datapath, [in_port], data)
+		elif request.opcode == arp.ARP_REQUEST:
+			#Unknown target: only edge ports get the request, the reply is unicast
+			self.flood_edges(datapath, in_port, pkt.data)
+		return request.opcode == arp.ARP_REQUEST
+
+	def flood_edges(self, datapath, in_port, data):
+		#One PacketOut per switch straight to its edge ports. Copies never
+		#cross an inter-switch link, so they cannot loop or miss again on
+		#another switch and come back as packet-ins.
+		for switch_id, datapath_curr in self.switches.items():
+			ports = self.net.edge_ports(switch_id)
+			if switch_id == datapath.id:
+				ports = [p for p in ports if p != in_port]
+			if ports:
+				self.send_packet(datapath_curr, ports, data)
+
+	def update_flood(self, switch_ids):
+		#Flood group of a switch: its spanning tree ports and its edge ports.
+		#An OFPGT_ALL group never copies a frame back out of its in_port.
+		for switch_id in switch_ids:
+			if switch_id not in self.switches:
+				continue
+			self.settle_flood(switch_id)
+			ports = [self.net.port(switch_id, n) for n in self.flood_tree.neighbors(switch_id)]
+			ports = tuple(sorted(set(ports + self.net.edge_ports(switch_id))))
+			if self.flooding.get(switch_id) == ports:
+				continue
+
+			datapath = self.switches[switch_id]
+			ofproto = datapath.ofproto
+			parser = datapath.ofproto_parser
+			buckets = [parser.OFPBucket(0, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+					[parser.OFPActionOutput(port)]) for port in ports]
+			if switch_id in self.flooding:
+				command = ofproto.OFPGC_MODIFY
+			else:
+				command = ofproto.OFPGC_ADD
+			self.add_group(datapath, FLOOD_GROUP, buckets, ofproto.OFPGT_ALL, command)
+			self.flooding[switch_id] = ports
+
+	def settle_flood(self, switch_id):
+		#Ports without a host seen on them join the group once discovery had
+		#time to find their links (see topocore.py); look again by then
+		wait = self.net.settle_time(switch_id)
+		if wait is not None and switch_id not in self.settling:
+			self.settling.add(switch_id)
+			hub.spawn_after(wait + 0.1, self._settled, switch_id)
+
+	def _settled(self, switch_id):
+		self.settling.discard(switch_id)
+		self.update_flood([switch_id])
+
+	def send_packet(self, datapath, ports, data):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		actions = [parser.OFPActionOutput(port) for port in ports]
+		out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+					in_port=ofproto.OFPP_CONTROLLER, actions=actions, data=data)
+		self.out.send(datapath, out)
+
+	def setup_flow(self, src, dst, msg):
+		self.touched = {}
+		routed = self.route_pair(src, dst)
+		if routed and not self.touched and msg is not None:
+			#A miss on a path held as programmed: the switches lost or refused
+			#its rules without us hearing of it, so they are sent again
+			self.resend(src, dst)
+			routed = self.route_pair(src, dst)
+		if routed:
+			self.fence((src, dst), msg)
+		else:
+			self.fence((src, dst))
+
+	def resend(self, src, dst):
+		for key in (('pair', src, dst), ('tree', None, dst)):
+			cookie = self.ledger.cookies.get(key)
+			if cookie is not None:
+				self.installed.forget_cookie(cookie)
+		self.routed.discard(dst)
+
+	def _path_collector(self):
+		while True:
+			self.path_event.wait()
+			self.path_event.clear()
+			while len(self.workers):
+				self.workers.flush()
+				hub.sleep(0.001)
+				for key, path, items in self.workers.done():
+					for src, dst, msg in items:
+						if src not in self.hosts or dst not in self.hosts:
+							continue
+						if not self.pending.queue((src, dst), msg):
+							self.setup_flow(src, dst, msg)
+
+	def fence(self, key, msg=None):
+		barriers = []
+		for datapath in self.touched.values():
+			req = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+			self.out.send(datapath, req)
+			barriers.append((datapath.id, req.xid))
+		self.touched = {}
+		if barriers:
+			setup = self.pending.start(key, barriers)
+			if msg is not None:
+				setup.queued.append(msg)
+		elif msg is not None:
+			#Nothing could be sent (e.g. a hop's switch is not connected): the
+			#tables would only miss again, so the packet is dropped
+			self.logger.debug('no rules for %s -> %s, packet dropped', key[0], key[1])
+
+	@set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+	def _barrier_reply_handler(self, ev):
+		msg = ev.msg
+		if self.meters is not None and self.meters.fenced(msg.datapath.id, msg.xid):
+			self.meters_fenced(msg.datapath)
+			return
+		setup = self.pending.complete(msg.datapath.id, msg.xid)
+		if setup is None:
+			return
+		for queued in setup.queued:
+			self.release(queued)
+
+	def release(self, msg):
+		#Re-inject a held packet-in through the switch's (now programmed) tables
+		datapath = msg.datapath
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+
+		actions = [parser.OFPActionOutput(ofproto.OFPP_TABLE)]
+		data = None
+		if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+			data = msg.data
+		out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
+					in_port=msg.match['in_port'], actions=actions, data=data)
+		self.out.send(datapath, out)
+
+	def route_pair(self, src, dst):
+		#src may be None to only (re)install the tree of a destination.
+		#Returns True if src has a forwarding path to dst.
+		dst_id = self.hosts.switch(dst)
+		if src is None:
+			src_id = None
+		else:
+			src_id = self.hosts.switch(src)
+			#A denied pair only has its drop rule (see install_drops)
+			if self.FIREWALL.denies(src, dst, self.hosts):
+				return False
+
+		#-----------------------------------------------------------
+		# STEP 1: - look up the shortest path between the src and dst
+		#           switches (cached per switch pair)
+		#-----------------------------------------------------------
+		if self.ROUTING_MODE == 'tree':
+			path = None
+			if dst not in self.routed:
+				self.install_tree(dst, dst_id)
+		elif self.ROUTING_MODE == 'ecmp':
+			path = None
+			if dst not in self.routed:
+				self.install_ecmp(dst, dst_id)
+		else:
+			path = self.paths.get(src_id, dst_id)
+		if path is not None:
+			#------------------------------------------------------------------------
+			# STEP 2: - install a routing rule for every switch in the path
+			#------------------------------------------------------------------------
+			cookie = self.ledger.record(('pair', src, dst), path,
+								zip(path, path[1:]))
+			#Egress first, so no hop forwards into a switch that is not ready
+			for idx, switch_id in reversed(list(enumerate(path))):
+				priority= 1
+				if switch_id not in self.switches:
+					continue
+				datapath_curr = self.switches[switch_id]
+				if  idx == len(path)-1:
+					port = self.hosts.port(dst)
+				else:
+					port = self.net.port(switch_id, path[idx+1])
+				self.add_pair_flow(datapath_curr, priority, src, dst, port, cookie)
+
+		if src_id is None:
+			return False
+		if path is not None:
+			return True
+		return src_id in self.trees.get(dst_id, ())
+
+	def install_drops(self, drops):
+		#------------------------------------------------------------------------
+		# STEP 3: - install the firewall rules in the ingress switch (i.e.,
+		#                first switch in the path) of every denied pair
+		#------------------------------------------------------------------------
+		for switch_id, src, dst in drops:
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
+			parser = datapath.ofproto_parser
+			actions = []
+			priority= 2
+			match = parser.OFPMatch(eth_dst=dst, eth_src= src)
+			cookie = self.ledger.record(('drop', src, dst), [switch_id], [])
+			self.add_flow(datapath, priority, match, actions, cookie)
+
+	def reinstall_pairs(self, switch_pairs):
+		by_switch = self.hosts.by_switch
+		for (src_id, dst_id) in switch_pairs:
+			for src in by_switch.get(src_id, ()):
+				for dst in by_switch.get(dst_id, ()):
+					if src != dst:
+						self.route_pair(src, dst)
+
+	def install_tree(self, dst, dst_id):
+		#All hosts behind the same egress switch share one tree
+		if dst_id not in self.trees:
+			self.trees[dst_id] = dest_tree(self.paths.adj, dst_id)
+			if self.FAST_FAILOVER:
+				self.backups[dst_id] = backup_next_hops(self.paths.adj,
+										self.trees[dst_id])
+		backups = self.backups.get(dst_id, {})
+
+		tree = self.trees[dst_id]
+		links = [(u, v) for u, v in tree.items() if v is not None]
+		links.extend(backups.items())
+		cookie = self.ledger.record(('tree', None, dst), tree, links)
 
-	def add_flow(self, datapath, priority, match, actions):
+		priority = 1
+		for switch_id, next_id in tree.items():
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
 			ofproto = datapath.ofproto
 			parser = datapath.ofproto_parser
+			if next_id is None:
+				port = self.hosts.port(dst)
+			else:
+				port = self.net.port(switch_id, next_id)
+			match = parser.OFPMatch(eth_dst=dst)
+			actions = [parser.OFPActionOutput(port)]
+
+			#Fast-failover group: the switch itself moves traffic to the backup
+			#bucket as soon as the primary port goes down
+			if switch_id in backups:
+				backup = self.net.port(switch_id, backups[switch_id])
+				ports = (port, backup)
+				group_id = self.group_for(switch_id, dst_id)
+				key = (switch_id, group_id)
+				if self.groups.get(key) != ports:
+					buckets = [parser.OFPBucket(0, p, ofproto.OFPG_ANY,
+							[parser.OFPActionOutput(p)]) for p in ports]
+					if key in self.groups:
+						command = ofproto.OFPGC_MODIFY
+					else:
+						command = ofproto.OFPGC_ADD
+					self.add_group(datapath, group_id, buckets,
+							ofproto.OFPGT_FF, command)
+					self.groups[key] = ports
+				actions = [parser.OFPActionGroup(group_id)]
+			self.add_flow(datapath, priority, match, actions, cookie)
+		self.routed.add(dst)
+
+	def install_ecmp(self, dst, dst_id):
+		if dst_id not in self.trees:
+			self.trees[dst_id] = ecmp_next_hops(self.paths.adj, dst_id)
+
+		hops = self.trees[dst_id]
+		links = [(u, v) for u in hops for v in hops[u]]
+		cookie = self.ledger.record(('tree', None, dst), hops, links)
+
+		priority = 1
+		for switch_id, next_ids in hops.items():
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
+			ofproto = datapath.ofproto
+			parser = datapath.ofproto_parser
+			match = parser.OFPMatch(eth_dst=dst)
+
+			if not next_ids:
+				port = self.hosts.port(dst)
+				actions = [parser.OFPActionOutput(port)]
+			elif len(next_ids) == 1:
+				port = self.net.port(switch_id, next_ids[0])
+				actions = [parser.OFPActionOutput(port)]
+			else:
+				#One select group per (switch, egress switch), shared by every
+				#destination host behind that egress switch
+				ports = tuple(self.net.port(switch_id, n) for n in next_ids)
+				group_id = self.group_for(switch_id, dst_id)
+				key = (switch_id, group_id)
+				if self.groups.get(key) != ports:
+					buckets = [parser.OFPBucket(1, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+							[parser.OFPActionOutput(port)]) for port in ports]
+					if key in self.groups:
+						command = ofproto.OFPGC_MODIFY
+					else:
+						command = ofproto.OFPGC_ADD
+					self.add_group(datapath, group_id, buckets,
+							ofproto.OFPGT_SELECT, command)
+					self.groups[key] = ports
+				actions = [parser.OFPActionGroup(group_id)]
+			self.add_flow(datapath, priority, match, actions, cookie)
+		self.routed.add(dst)
+
+	def rehome(self, mac):
+		#A host that moved only invalidates its own flows: the ones towards
+		#it, from it and its firewall drops are deleted by cookie; the drops
+		#are pushed again for the new location right after, the routes are
+		#rebuilt by the packet-ins that need them
+		for entry in self.ledger.for_host(mac):
+			self.ledger.forget(entry.cookie)
+			self.delete_flows(entry.cookie, entry.switches)
+		self.routed.discard(mac)
+		self.logger.info('host %s moved to %016x port %d', mac,
+					self.hosts.switch(mac), self.hosts.port(mac))
+
+	def delete_flows(self, cookie, switch_ids):
+		for switch_id in switch_ids:
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
+			ofproto = datapath.ofproto
+			parser = datapath.ofproto_parser
+
+			mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie,
+						cookie_mask=COOKIE_MASK, table_id=ofproto.OFPTT_ALL,
+						command=ofproto.OFPFC_DELETE,
+						out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY)
+			self.out.send(datapath, mod)
+		self.installed.forget_cookie(cookie)
+
+	def group_for(self, switch_id, dst_id):
+		#Group id of a switch's group towards a destination switch; dpids are
+		#64-bit, group ids 32-bit and FLOOD_GROUP is taken
+		ids = self.group_ids.setdefault(switch_id, {})
+		if dst_id not in ids:
+			ids[dst_id] = len(ids) + 1
+		return ids[dst_id]
+
+	def add_group(self, datapath, group_id, buckets, group_type=None, command=None):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+
+		if group_type is None:
+			group_type = ofproto.OFPGT_FF
+		if command is None:
+			command = ofproto.OFPGC_ADD
+
+		req = parser.OFPGroupMod(datapath, command, group_type, group_id, buckets)
+		self.out.send(datapath, req)
+		self.installed.sent_as(datapath.id, req.xid, ('group', (datapath.id, group_id)))
+		self.touched[datapath.id] = datapath
+
+	def add_pair_flow(self, datapath, priority, src, dst, port, cookie=0):
+		#Hot path for (eth_src, eth_dst) -> output rules: the FlowMod is patched
+		#into a pre-encoded template instead of built from parser objects
+		key = (datapath.id, 0, priority, (('eth_dst', dst), ('eth_src', src)))
+		new = key not in self.installed
+		if not self.installed.needs_install(key, ('output', port), cookie):
+			return
+
+		template = self.templates.get(priority)
+		if template is None:
+			idle, hard = self.lifecycle.timeouts_for('pair')
+			template = self.templates[priority] = FlowModTemplate(priority,
+						idle_timeout=idle, hard_timeout=hard,
+						flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
+		xid = self.out.next_xid(datapath)
+		self.out.send_raw(datapath, template.encode(xid, dst, src, port, cookie))
+		self.installed.sent_as(datapath.id, xid, ('flow', key, cookie, new))
+		self.touched[datapath.id] = datapath
+		if new:
+			self.count_flow(datapath)
+
+	def add_flow(self, datapath, priority, match, actions, cookie=0, meter=None):
+			ofproto = datapath.ofproto
+			parser = datapath.ofproto_parser
+
+			#Skip FlowMods that would only repeat what the switch already has
+			key = flow_key(datapath.id, 0, priority, match)
+			new = key not in self.installed
+			value = actions_key(actions)
+			if meter is not None:
+				value += ('meter:%d' % meter,)
+			if not self.installed.needs_install(key, value, cookie):
+				self.logger.debug('duplicate FlowMod to %016x suppressed (%d saved)',
+							datapath.id, self.installed.suppressed)
+				return
 
 			inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
 								actions)]
+			if meter is not None:
+				inst.insert(0, parser.OFPInstructionMeter(meter, ofproto.OFPIT_METER))
 
-			mod = parser.OFPFlowMod(datapath=datapath, priority=priority
-						, match=match, 
+			#Controller-managed rules time out by class and report their removal
+			idle, hard = self.lifecycle.timeouts_for(self.ledger.kind(cookie))
+			flags = 0
+			if cookie:
+				flags = ofproto.OFPFF_SEND_FLOW_REM
+
+			mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie,
+						idle_timeout=idle, hard_timeout=hard, flags=flags,
+						priority=priority, match=match, 
 						instructions=inst)
 
-			datapath.send_msg(mod)
+			self.out.send(datapath, mod)
+			self.installed.sent_as(datapath.id, mod.xid, ('flow', key, cookie, new))
+			self.touched[datapath.id] = datapath
+			if new:
+				self.count_flow(datapath)
+
+	def delete_flow(self, datapath, priority, match):
+		key = flow_key(datapath.id, 0, priority, match)
+		if key not in self.installed:
+			return
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		mod = parser.OFPFlowMod(datapath=datapath, command=ofproto.OFPFC_DELETE_STRICT,
+					priority=priority, out_port=ofproto.OFPP_ANY,
+					out_group=ofproto.OFPG_ANY, match=match)
+		self.out.send(datapath, mod)
+		self.installed.forget(key)
+
+	def count_flow(self, datapath):
+		#A table close to full has its coldest routing rules evicted
+		self.lifecycle.added(datapath.id)
+		self.check_capacity(datapath)
+
+	def check_capacity(self, datapath):
+		#One flow stats request at a time per switch; one whose reply was
+		#lost does not hold up eviction past its deadline
+		dpid = datapath.id
+		if not self.lifecycle.near_capacity(dpid):
+			return
+		pending = self.flow_stats.get(dpid)
+		if pending is not None and time.time() < pending[0]:
+			return
+		self.request_flow_stats(datapath)
+
+	def request_flow_stats(self, datapath):
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		req = parser.OFPFlowStatsRequest(datapath, 0, 0, ofproto.OFPP_ANY,
+						ofproto.OFPG_ANY, ROUTE_COOKIE, ROUTE_COOKIE,
+						parser.OFPMatch())
+		self.out.send(datapath, req)
+		#(deadline, xid, reply parts)
+		self.flow_stats[datapath.id] = (time.time() + self.FLOW_STATS_TIMEOUT, req.xid, [])
+
+	def _table_monitor(self):
+		#Switches are polled on their own staggered schedules
+		while True:
+			hub.sleep(self.poller.sleep_time())
+			for datapath in self.poller.due():
+				req = datapath.ofproto_parser.OFPTableStatsRequest(datapath, 0)
+				self.out.send(datapath, req)
+				if self.meters is not None and self.meters.supported.get(datapath.id):
+					self.meters.request_stats(datapath)
+				self.logger.debug('send queue %016x: %s', datapath.id,
+							self.out.stats(datapath.id))
+
+	@set_ev_cls(ofp_event.EventOFPTableStatsReply, MAIN_DISPATCHER)
+	def _table_stats_reply_handler(self, ev):
+		datapath = ev.msg.datapath
+		self.lifecycle.table_stats(datapath.id, ev.msg.body)
+		self.poller.reply(datapath.id, self.lifecycle.active.get(datapath.id))
+		self.check_capacity(datapath)
+
+	@set_ev_cls(ofp_event.EventOFPMeterFeaturesStatsReply, MAIN_DISPATCHER)
+	def _meter_features_reply_handler(self, ev):
+		datapath = ev.msg.datapath
+		if self.meters is None or not self.meters.features(datapath, ev.msg.body):
+			return
+		parser = datapath.ofproto_parser
+		actions = self.miss_actions[datapath.id]
+
+		#ARP broadcasts for the proxy always share the switch meter
+		xid = self.meters.add_meter(datapath, MISS_METER)
+		self.installed.sent_as(datapath.id, xid, ('meter', MISS_METER))
+		match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_ARP,
+					eth_dst='ff:ff:ff:ff:ff:ff')
+		self.add_flow(datapath, 2, match, actions, meter=MISS_METER)
+		if self.meters.per_port:
+			self.meter_ports([datapath.id])
+		else:
+			self.add_flow(datapath, 0, parser.OFPMatch(), actions, meter=MISS_METER)
+
+	def meter_ports(self, switch_ids):
+		#Per-port mode: one metered miss rule per ingress port replaces the
+		#catch-all one, once the switch's ports are known and its meters are
+		#in place (see meters_fenced)
+		for switch_id in switch_ids:
+			if switch_id not in self.switches or not self.meters.supported.get(switch_id):
+				continue
+			datapath = self.switches[switch_id]
+			parser = datapath.ofproto_parser
+			actions = self.miss_actions[switch_id]
+			ports = self.net.switch_ports.get(switch_id, ())
+			added, removed, xids = self.meters.sync_ports(datapath, ports)
+			for xid, meter_id in xids.items():
+				self.installed.sent_as(switch_id, xid, ('meter', meter_id))
+			for port_no in added:
+				self.add_flow(datapath, 0, parser.OFPMatch(in_port=port_no), actions,
+						meter=self.meters.port_meter(switch_id, port_no))
+			for port_no in removed:
+				self.delete_flow(datapath, 0, parser.OFPMatch(in_port=port_no))
+			if added and flow_key(switch_id, 0, 0, parser.OFPMatch()) in self.installed:
+				req = parser.OFPBarrierRequest(datapath)
+				self.out.send(datapath, req)
+				self.meters.fence(switch_id, req.xid)
+
+	def meters_fenced(self, datapath):
+		#Errors about the port meters came before the barrier, so every port
+		#has its metered miss rule by now
+		if self.meters.supported.get(datapath.id):
+			self.delete_flow(datapath, 0, datapath.ofproto_parser.OFPMatch())
+
+	def meter_failed(self, dpid, meter_id):
+		self.logger.warning('meter %d refused by %016x', meter_id, dpid)
+		datapath = self.switches.get(dpid)
+		if datapath is None:
+			return
+		if meter_id == MISS_METER:
+			#No switch meter to fall back to: the miss rules stay unmetered
+			self.meters.supported[dpid] = False
+			return
+		port_no = self.meters.meter_failed(dpid, meter_id)
+		if port_no is not None:
+			parser = datapath.ofproto_parser
+			self.add_flow(datapath, 0, parser.OFPMatch(in_port=port_no),
+					self.miss_actions[dpid], meter=MISS_METER)
+
+	@set_ev_cls(ofp_event.EventOFPMeterStatsReply, MAIN_DISPATCHER)
+	def _meter_stats_reply_handler(self, ev):
+		dpid = ev.msg.datapath.id
+		for meter_id, dropped in self.meters.stats(dpid, ev.msg.body):
+			self.logger.warning('packet-in meter %d on %016x dropped %d packets '
+					'(%d in total)', meter_id, dpid, dropped,
+					self.meters.drops[(dpid, meter_id)])
+
+	@set_ev_cls(ofp_event.EventOFPTableFeaturesStatsReply, MAIN_DISPATCHER)
+	def _table_features_reply_handler(self, ev):
+		self.lifecycle.table_features(ev.msg.datapath.id, ev.msg.body)
+
+	@set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+	def _flow_stats_reply_handler(self, ev):
+		msg = ev.msg
+		datapath = msg.datapath
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+
+		#Only the routing rules are asked for; the reply may come in parts.
+		#Late parts of a request given up on are ignored.
+		pending = self.flow_stats.get(datapath.id)
+		if pending is None or pending[1] != msg.xid:
+			return
+		parts = pending[2]
+		parts.extend(msg.body)
+		if msg.flags & ofproto.OFPMPF_REPLY_MORE:
+			return
+		del self.flow_stats[datapath.id]
+
+		key_of = lambda dpid, stat: flow_key(dpid, stat.table_id, stat.priority, stat.match)
+		victims = self.lifecycle.flow_stats(datapath.id, parts, key_of, self.ledger.kind)
+		for cookie, priority, match, key in victims:
+			mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie,
+						cookie_mask=COOKIE_MASK, table_id=0,
+						command=ofproto.OFPFC_DELETE_STRICT, priority=priority,
+						out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+						match=match)
+			self.out.send(datapath, mod)
+			self.flow_gone(datapath.id, cookie, key)
+		if victims:
+			self.logger.info('evicted %d flows from %016x (%d rules left)',
+					len(victims), datapath.id, self.lifecycle.active[datapath.id])
+
+	@set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+	def _flow_removed_handler(self, ev):
+		msg = ev.msg
+		ofproto = msg.datapath.ofproto
+		key = flow_key(msg.datapath.id, msg.table_id, msg.priority, msg.match)
+		self.lifecycle.removed(msg.datapath.id, key,
+					msg.reason == ofproto.OFPRR_IDLE_TIMEOUT)
+		self.flow_gone(msg.datapath.id, msg.cookie, key)
+
+	@set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+	def _error_handler(self, ev):
+		#A refused FlowMod, GroupMod or MeterMod leaves nothing on the switch, so its
+		#state is forgotten and the next packet-in that needs it sends it again
+		msg = ev.msg
+		dpid = msg.datapath.id
+		self.logger.warning('error type %d code %d from %016x (xid %d)',
+					msg.type, msg.code, dpid, msg.xid)
+		item = self.installed.error(dpid, msg.xid)
+		if item is None:
+			return
+		if item[0] == 'meter':
+			self.meter_failed(dpid, item[1])
+			return
+		if item[0] == 'group':
+			self.groups.pop(item[1], None)
+			if item[1][1] == FLOOD_GROUP:
+				self.flooding.pop(dpid, None)
+			return
+		kind, key, cookie, new = item
+		self.pending.fail(dpid)
+		if new:
+			self.lifecycle.removed(dpid, key)
+		self.flow_gone(dpid, cookie, key)
+
+	def flow_gone(self, dpid, cookie, key):
+		#An expired or evicted rule must be sent again when traffic needs it;
+		#a destination tree missing a hop is rebuilt as a whole. The ledger
+		#forgets the unit once none of its switches has its rule, so a later
+		#link failure does not reroute it.
+		self.installed.forget(key, cookie)
+		entry = self.ledger.entries.get(cookie)
+		if entry is None:
+			return
+		if entry.key[0] == 'tree':
+			self.routed.discard(entry.key[2])
+		self.ledger.switch_gone(cookie, dpid)
 
 
 
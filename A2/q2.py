@@ -6,38 +6,35 @@ from ryu.controller.handler import set_ev_cls
 from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER
 from ryu.controller import ofp_event
 
-from ryu.topology import event, switches
-from ryu.topology.api import get_switch, get_link
+from ryu.lib.packet import ether_types
 
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
+from topocore import Topology
+from hosttable import HostTable, MOVED, delete_host_flows
+from pathcache import PathCache
+from pktview import PacketView
+from missconfig import miss_action
+from topoevents import TopologyEvents
+from fwpolicy import odd_even
 
-import networkx as nx
-
-class Controller1(app_manager.RyuApp):
+class Controller1(TopologyEvents, app_manager.RyuApp):
 
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+	# Table-miss frame size, as in q1.py
+	MISS_SEND_LEN = None
+
+	# Host firewall, as in q1.py
+	FIREWALL = odd_even()
+
 	def __init__(self, *args, **kwargs):
 		super(Controller1, self).__init__(*args, **kwargs)
 		self.topology_api_app = self
-		self.net = nx.DiGraph()
+		self.net = Topology()
+		self.paths = PathCache()
+		self.hosts = HostTable()
 		self.switches = {}
 
 		
-	@set_ev_cls(event.EventSwitchEnter)
-	def get_topology_data(self, ev):
-		switch_list = get_switch(self.topology_api_app, None)
-		switches = [switch.dp.id for switch in switch_list]
-		self.net.add_nodes_from(switches)
-
-		link_list = get_link(self.topology_api_app, None)
-
-		for link in link_list:
-			self.net.add_edge(link.src.dpid, link.dst.dpid, port=link.src.port_no)
-			self.net.add_edge(link.dst.dpid, link.src.dpid, port=link.dst.port_no)
-
-
 	@set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
 	def switch_features_handler(self, ev):
 		#Process switch connection 
@@ -58,14 +55,16 @@ class Controller1(app_manager.RyuApp):
 		self.add_flow_goto(datapath, priority, table_id, match, dst_table)
 
 		match = parser.OFPMatch()	
-		actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-  				  ofproto.OFPCML_NO_BUFFER)]
+		actions = [miss_action(datapath, ev.msg.n_buffers, self.MISS_SEND_LEN)]
 			
 		#Default rule in table 1 to send packets to the controller
 		table_id = 1
 		priority= 0
 		self.add_flow(datapath, priority, table_id, match, actions)
 
+		#Firewall drops of the hosts already known behind this switch
+		self.install_drops(self.FIREWALL.drops_for_switch(datapath.id, self.hosts))
+
 
 	@set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
 	def _packet_in_handler(self, ev):
@@ -74,28 +73,39 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		pkt = packet.Packet(msg.data)
-		eth = pkt.get_protocol(ethernet.ethernet)
+		pkt = PacketView(msg.data)
 
-		dpid = datapath.id
-		src = eth.src
-		dst = eth.dst
+		if pkt.ethertype == ether_types.ETH_TYPE_LLDP:
+			return
 
-		if src not in self.net:
-			self.net.add_node(src)
-			self.net.add_edge(dpid,src,port=ofproto.OFPXMT_OFB_IN_PHY_PORT)
-			self.net.add_edge(src,dpid)
-		if dst in self.net:
-			src_id = list(self.net[src].keys())[0]
-			dst_id = list(self.net[dst].keys())[0]
+		dpid = datapath.id
+		src = pkt.src
+		dst = pkt.dst
+		in_port = msg.match['in_port']
+
+		#Hosts are only learned on edge ports; a host seen at a new one moved
+		if self.net.may_host(dpid, in_port):
+			change = self.hosts.learn(src, dpid, in_port)
+			if change == MOVED:
+				delete_host_flows(self.switches.values(), src)
+			if change is not None:
+				self.install_drops(self.FIREWALL.drops_for_host(src, self.hosts))
+		if src not in self.hosts:
+			return
+		if dst in self.hosts:
+			#A denied pair only has its table-0 drop (see install_drops)
+			if self.FIREWALL.denies(src, dst, self.hosts):
+				return
+			src_id = self.hosts.switch(src)
+			dst_id = self.hosts.switch(dst)
 
 			# NOTE : As it was mentioned that we do not need to send the packet out
 			# therefore when we do the pingall for the first time it sets up all the routes
 			# but the pingall itself (for the first time) does not work. Once all the 
 			# routes are setup and we run pingall again, everything works as intented.
 
-			if nx.has_path(self.net, src, dst):
-				path = nx.shortest_path(self.net, src, dst)[1:-1]
+			path = self.paths.get(src_id, dst_id)
+			if path is not None:
 				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
 
 				#------------------------------------------------------------------------
@@ -108,22 +118,27 @@ class Controller1(app_manager.RyuApp):
 					table_id = 1
 					datapath_curr = self.switches[switch_id]
 					if  idx == len(path)-1:
-						port = self.net[switch_id][dst]['port']
+						port = self.hosts.port(dst)
 					else:
-						port = self.net[switch_id][path[idx+1]]['port']
+						port = self.net.port(switch_id, path[idx+1])
 					actions = [parser.OFPActionOutput(port)]
 					self.add_flow(datapath_curr, priority, table_id, match, actions)
-					
-			#------------------------------------------------------------------------
-			# STEP 3: - Add dropping rule in table 0 
-			#------------------------------------------------------------------------
-			if not((src_id%2 and dst_id%2) or not(src_id% 2 or dst_id%2)):
-				actions = []
-				priority= 1
-				table_id = 0
-				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
-				self.add_flow(datapath, priority, table_id, match, actions)
-				
+
+	def install_drops(self, drops):
+		#------------------------------------------------------------------------
+		# STEP 3: - Add dropping rules in table 0
+		#------------------------------------------------------------------------
+		for switch_id, src, dst in drops:
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
+			parser = datapath.ofproto_parser
+			actions = []
+			priority= 1
+			table_id = 0
+			match = parser.OFPMatch(eth_dst=dst, eth_src= src)
+			self.add_flow(datapath, priority, table_id, match, actions)
+
 	def add_flow(self, datapath, priority, tableID, match, actions):
 			ofproto = datapath.ofproto
 			parser = datapath.ofproto_parser
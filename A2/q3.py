@@ -6,25 +6,51 @@ from ryu.controller.handler import set_ev_cls
 from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller import ofp_event
 
-from ryu.topology import event, switches
-from ryu.topology.api import get_switch, get_link
+from ryu.lib.packet import ether_types
 
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
-
-import networkx as nx
 from ryu.lib import hub
 
-class Controller1(app_manager.RyuApp):
+from topocore import Topology
+from hosttable import HostTable, MOVED, delete_host_flows
+from pathcache import PathCache
+from pktview import PacketView
+from missconfig import miss_action
+from statspoll import StatsPoller
+from counterstore import CounterStore, PORT_FIELDS
+from topoevents import TopologyEvents
+from fwpolicy import odd_even
+
+class Controller1(TopologyEvents, app_manager.RyuApp):
 
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+	# Table-miss frame size, as in q1.py
+	MISS_SEND_LEN = None
+
+	# Switches whose port counters are polled (None: every switch) and their
+	# starting poll interval; busy switches are polled faster, idle ones
+	# slower (see statspoll.py)
+	STATS_SWITCHES = (5,)
+	STATS_INTERVAL = 5
+
+	# Port counter history (see counterstore.py): samples kept per port, and
+	# the window (s) of the averaged rates
+	STATS_DEPTH = 120
+	RATE_WINDOW = 30
+
+	# Host firewall, as in q1.py
+	FIREWALL = odd_even()
+
 	def __init__(self, *args, **kwargs):
 		super(Controller1, self).__init__(*args, **kwargs)
 		self.topology_api_app = self
-		self.net = nx.DiGraph()
+		self.net = Topology()
+		self.paths = PathCache()
+		self.hosts = HostTable()
 		self.switches = {}
 		self.datapaths = {}
+		self.poller = StatsPoller(self.STATS_SWITCHES, self.STATS_INTERVAL)
+		self.port_counters = CounterStore(PORT_FIELDS, depth=self.STATS_DEPTH)
 		self.monitor_thread = hub.spawn(self._monitor)
 
 	@set_ev_cls(ofp_event.EventOFPStateChange,
@@ -35,23 +61,13 @@ class Controller1(app_manager.RyuApp):
 			if datapath.id not in self.datapaths:
 				self.logger.debug('register datapath: %016x', datapath.id)
 				self.datapaths[datapath.id] = datapath
+			self.poller.add(datapath)
 		elif ev.state == DEAD_DISPATCHER:
 			if datapath.id in self.datapaths:
 				self.logger.debug('unregister datapath: %016x', datapath.id)
 				del self.datapaths[datapath.id]
-
-	@set_ev_cls(event.EventSwitchEnter)
-	def get_topology_data(self, ev):
-		switch_list = get_switch(self.topology_api_app, None)
-		switches = [switch.dp.id for switch in switch_list]
-		self.net.add_nodes_from(switches)
-
-		link_list = get_link(self.topology_api_app, None)
-
-		for link in link_list:
-			self.net.add_edge(link.src.dpid, link.dst.dpid, port=link.src.port_no)
-			self.net.add_edge(link.dst.dpid, link.src.dpid, port=link.dst.port_no)
-
+			self.poller.remove(datapath.id)
+			self.port_counters.forget_switch(datapath.id)
 
 	@set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
 	def switch_features_handler(self, ev):
@@ -67,12 +83,14 @@ class Controller1(app_manager.RyuApp):
 		self.add_flow_goto(datapath, 0, tableID, match, 1)
 
 		match = parser.OFPMatch()	
-		actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-  				  ofproto.OFPCML_NO_BUFFER)]
+		actions = [miss_action(datapath, ev.msg.n_buffers, self.MISS_SEND_LEN)]
 			
 		tableID = 1
 		self.add_flow(datapath, 0, tableID, match, actions)
 
+		#Firewall drops of the hosts already known behind this switch
+		self.install_drops(self.FIREWALL.drops_for_switch(datapath.id, self.hosts))
+
 
 	@set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
 	def _packet_in_handler(self, ev):
@@ -81,23 +99,34 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		pkt = packet.Packet(msg.data)
-		eth = pkt.get_protocol(ethernet.ethernet)
+		pkt = PacketView(msg.data)
+
+		if pkt.ethertype == ether_types.ETH_TYPE_LLDP:
+			return
 
 		dpid = datapath.id
-		src = eth.src
-		dst = eth.dst
-
-		if src not in self.net:
-			self.net.add_node(src)
-			self.net.add_edge(dpid,src,port=ofproto.OFPXMT_OFB_IN_PHY_PORT)
-			self.net.add_edge(src,dpid)
-
-		if dst in self.net:
-			src_id = list(self.net[src].keys())[0]
-			dst_id = list(self.net[dst].keys())[0]
-			if nx.has_path(self.net, src, dst):
-				path = nx.shortest_path(self.net, src, dst)[1:-1]
+		src = pkt.src
+		dst = pkt.dst
+		in_port = msg.match['in_port']
+
+		#Hosts are only learned on edge ports; a host seen at a new one moved
+		if self.net.may_host(dpid, in_port):
+			change = self.hosts.learn(src, dpid, in_port)
+			if change == MOVED:
+				delete_host_flows(self.switches.values(), src)
+			if change is not None:
+				self.install_drops(self.FIREWALL.drops_for_host(src, self.hosts))
+		if src not in self.hosts:
+			return
+
+		if dst in self.hosts:
+			#A denied pair only has its table-0 drop (see install_drops)
+			if self.FIREWALL.denies(src, dst, self.hosts):
+				return
+			src_id = self.hosts.switch(src)
+			dst_id = self.hosts.switch(dst)
+			path = self.paths.get(src_id, dst_id)
+			if path is not None:
 				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
 
 				for switch_id in path:
@@ -106,18 +135,24 @@ class Controller1(app_manager.RyuApp):
 					table_id = 1
 					datapath_curr = self.switches[switch_id]
 					if  idx == len(path)-1:
-						port = self.net[switch_id][dst]['port']
+						port = self.hosts.port(dst)
 					else:
-						port = self.net[switch_id][path[idx+1]]['port']
+						port = self.net.port(switch_id, path[idx+1])
 					actions = [parser.OFPActionOutput(port)]
 					self.add_flow(datapath_curr, priority, table_id, match, actions)
-					
-			if not((src_id%2 and dst_id%2) or not(src_id% 2 or dst_id%2)):
-				actions = []
-				priority= 1
-				table_id = 0
-				match = parser.OFPMatch(eth_dst=dst, eth_src= src)	
-				self.add_flow(datapath, priority, table_id, match, actions)
+
+	def install_drops(self, drops):
+		#Firewall drops in table 0 of the ingress switch
+		for switch_id, src, dst in drops:
+			if switch_id not in self.switches:
+				continue
+			datapath = self.switches[switch_id]
+			parser = datapath.ofproto_parser
+			actions = []
+			priority= 1
+			table_id = 0
+			match = parser.OFPMatch(eth_dst=dst, eth_src= src)
+			self.add_flow(datapath, priority, table_id, match, actions)
 
 	def add_flow(self, datapath, priority, tableID, match, actions):
 			ofproto = datapath.ofproto
@@ -148,9 +183,9 @@ class Controller1(app_manager.RyuApp):
 
 	def _monitor(self):
 			while True:	
-				if self.switches:
-					self._request_stats(self.switches[5])
-				hub.sleep(5)
+				for datapath in self.poller.due():
+					self._request_stats(datapath)
+				hub.sleep(self.poller.sleep_time())
 
 	def _request_stats(self, datapath):
 		self.logger.debug('send stats request: %016x', datapath.id)
@@ -171,15 +206,28 @@ class Controller1(app_manager.RyuApp):
 			  '--------------------------')
 		self.logger.info('datapath         '
 						'port_no           '
-						'rx_packets')
+						'rx_packets rx_pkt/s  tx_pkt/s  rx_avg/s')
 		self.logger.info('---------------- '
 						'----------------- '
-						'-------- ')
+						'---------- --------- --------- ---------')
 		body = ev.msg.body
+		dpid = ev.msg.datapath.id
+		self.poller.reply(dpid,
+				sum(port.rx_packets + port.tx_packets for port in body))
 		for port in body:
-			self.logger.info('%016X %17s %8x ',
-					ev.msg.datapath.id,
+			key = (dpid, port.port_no)
+			rates = self.port_counters.add(key,
+					(port.rx_packets, port.tx_packets, port.rx_bytes, port.tx_bytes),
+					port.duration_sec + port.duration_nsec * 1e-9)
+			if rates is None:
+				#First sample of the port: no rate yet
+				self.logger.info('%016X %17s %10d', dpid, port.port_no, port.rx_packets)
+				continue
+			average = self.port_counters.average(key, self.RATE_WINDOW)
+			self.logger.info('%016X %17s %10d %9.1f %9.1f %9.1f',
+					dpid,
 					port.port_no,
-					port.rx_packets,)
+					port.rx_packets,
+					rates[0], rates[1], average[0])
 		
 		print('\n')
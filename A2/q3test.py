@@ -6,27 +6,54 @@ from ryu.controller.handler import set_ev_cls
 from ryu.controller.handler import MAIN_DISPATCHER, CONFIG_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller import ofp_event
 
-from ryu.topology import event, switches
-from ryu.topology.api import get_switch, get_link
+from ryu.lib.packet import ether_types
 
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
 from ryu.lib import hub
 
-import networkx as nx
+from topocore import Topology
+from hosttable import HostTable, MOVED, delete_host_flows
+from pathcache import PathCache
+from pktview import PacketView
+from missconfig import miss_action
+from statspoll import StatsPoller
+from counterstore import CounterStore, PORT_FIELDS
+from flowcache import InstallCache, flow_key, actions_key
+from pending import PendingSetups
+from topoevents import TopologyEvents
 
-class Controller1(app_manager.RyuApp):
+class Controller1(TopologyEvents, app_manager.RyuApp):
 
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
+	# Table-miss frame size, as in q1.py
+	MISS_SEND_LEN = None
+
+	# Switches whose port counters are polled (None: every switch) and their
+	# starting poll interval; busy switches are polled faster, idle ones
+	# slower (see statspoll.py)
+	STATS_SWITCHES = (5,)
+	STATS_INTERVAL = 5
+
+	# Port counter history (see counterstore.py): samples kept per port, and
+	# the window (s) of the averaged rates
+	STATS_DEPTH = 120
+	RATE_WINDOW = 30
+
 	def __init__(self, *args, **kwargs):
 		super(Controller1, self).__init__(*args, **kwargs)
 		self.topology_api_app = self
-		self.net = nx.DiGraph()
+		self.net = Topology()
+		self.paths = PathCache()
+		self.hosts = HostTable()
+		self.installed = InstallCache()
+		self.pending = PendingSetups()
+		self.touched = {}
 		self.switches = {}
 		self.datapaths = {}
 
 		## Monitor threads
+		self.poller = StatsPoller(self.STATS_SWITCHES, self.STATS_INTERVAL)
+		self.port_counters = CounterStore(PORT_FIELDS, depth=self.STATS_DEPTH)
 		self.monitor_thread = hub.spawn(self._monitor)
 
 	#--------------------------------------
@@ -40,23 +67,13 @@ class Controller1(app_manager.RyuApp):
 			if datapath.id not in self.datapaths:
 				self.logger.debug('register datapath: %016x', datapath.id)
 				self.datapaths[datapath.id] = datapath
+			self.poller.add(datapath)
 		elif ev.state == DEAD_DISPATCHER:
 			if datapath.id in self.datapaths:
 				self.logger.debug('unregister datapath: %016x', datapath.id)
 				del self.datapaths[datapath.id]
-
-		
-	@set_ev_cls(event.EventSwitchEnter)
-	def get_topology_data(self, ev):
-		switch_list = get_switch(self.topology_api_app, None)
-		switches = [switch.dp.id for switch in switch_list]
-		self.net.add_nodes_from(switches)
-
-		link_list = get_link(self.topology_api_app, None)
-
-		for link in link_list:
-			self.net.add_edge(link.src.dpid, link.dst.dpid, port=link.src.port_no)
-			self.net.add_edge(link.dst.dpid, link.src.dpid, port=link.dst.port_no)
+			self.poller.remove(datapath.id)
+			self.port_counters.forget_switch(datapath.id)
 
 
 	@set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -64,6 +81,7 @@ class Controller1(app_manager.RyuApp):
 		#Process switch connection 
 		datapath = ev.msg.datapath
 		self.switches[datapath.id] = datapath
+		self.installed.forget_switch(datapath.id)
 		ofproto = datapath.ofproto	
 		parser = datapath.ofproto_parser
 
@@ -74,8 +92,7 @@ class Controller1(app_manager.RyuApp):
 
 		#Add default rule for table 1
 		match = parser.OFPMatch()	
-		actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-  				  ofproto.OFPCML_NO_BUFFER)]
+		actions = [miss_action(datapath, ev.msg.n_buffers, self.MISS_SEND_LEN)]
 			
 		tableID = 1
 		self.add_flow(datapath, 0, tableID, match, actions)
@@ -88,31 +105,46 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		pkt = packet.Packet(msg.data)
-		eth = pkt.get_protocol(ethernet.ethernet)
+		pkt = PacketView(msg.data)
 
-		dpid = datapath.id
-		src = eth.src
-		dst = eth.dst
+		if pkt.ethertype == ether_types.ETH_TYPE_LLDP:
+			return
 
-		if src not in self.net:
-			self.net.add_node(src)
-			self.net.add_edge(dpid,src,port=ofproto.OFPXMT_OFB_IN_PHY_PORT)
-			self.net.add_edge(src,dpid)
-			print(">> Nodes <<")
-			print(self.net.nodes())
-			print(">> Edges <<")
-			print(self.net.edges())
-			#print(type(self.net.edges()))
-
-
-		if dst in self.net:
+		dpid = datapath.id
+		src = pkt.src
+		dst = pkt.dst
+		in_port = msg.match['in_port']
+
+		#Hosts are only learned on edge ports; a host seen at a new one moved
+		if self.net.may_host(dpid, in_port):
+			change = self.hosts.learn(src, dpid, in_port)
+			if change == MOVED:
+				delete_host_flows(self.switches.values(), src)
+				self.installed.forget_mac(src)
+			if change is not None:
+				print(">> Hosts <<")
+				print(self.hosts.macs())
+				print(">> Edges <<")
+				print(self.net.edges())
+				#print(type(self.net.edges()))
+		if src not in self.hosts:
+			return
+
+		if dst in self.hosts:
+
+			#Packets of a pair whose rules are still being applied wait for
+			#the barriers of that setup instead of being routed again
+			if self.pending.queue((src, dst), msg):
+				return
+			self.touched = {}
 
-			
 			#-----------------------------------------------------------
 			# STEP 1: TODO - compute shortest path between src
 			#-----------------------------------------------------------
-			shortestPath2 = nx.shortest_path(self.net,src,dst)
+			path = self.paths.get(self.hosts.switch(src), self.hosts.switch(dst))
+			if path is None:
+				return
+			shortestPath2 = [src] + path + [dst]
 			print("Shortest Path between SRC and DST : \t",shortestPath2)
 
 			shortestPath = shortestPath2[1:-1]
@@ -123,28 +155,26 @@ class Controller1(app_manager.RyuApp):
 			#					install a firewall rule in the ingress switch (i.e., 
 			#                	first switch in the path), if needed
 			#------------------------------------------------------------------------
-			index=0;
 			if((shortestPath[0] + shortestPath[len(shortestPath)-1]) % 2 == 0):
 				tableID=1;
-				for i in shortestPath:
+				#Egress first, so no hop forwards into a switch that is not ready
+				for index in reversed(range(len(shortestPath))):
+					i = shortestPath[index]
 					datapath2 = self.switches[i];
-					rulePrinter = "";
 
 					if index != len(shortestPath)-1:
-						out_port=self.net[i][shortestPath[index+1]]['port']
-						match = parser.OFPMatch(eth_src=src, eth_dst=dst)
-						actions = [parser.OFPActionOutput(out_port)]
-						rulePrinter = rulePrinter + "Added rule: \n switch:"+str(i)+" output port:"+str(out_port)
-
-					if(index == len(shortestPath)-1):
-						actions.append(parser.OFPActionOutput(1))
-						rulePrinter = rulePrinter +", output port:"+str(1)
-						
+						out_port=self.net.port(i, shortestPath[index+1])
+					else:
+						out_port=self.hosts.port(dst)
+					match = parser.OFPMatch(eth_src=src, eth_dst=dst)
+					actions = [parser.OFPActionOutput(out_port)]
+
 					self.add_flow(datapath2, 1, tableID, match, actions)
-					print(rulePrinter)
-					index=index+1;
-					out = parser.OFPPacketOut(datapath=datapath2, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions)
-					datapath2.send_msg(out)
+					print("Added rule: \n switch:"+str(i)+" output port:"+str(out_port))
+
+				#Fence every hop with a barrier; the original packet is released
+				#once, where it entered, after all of them have been answered
+				self.fence((src, dst), msg)
 						
 			else:
 				tableID = 0;
@@ -154,10 +184,42 @@ class Controller1(app_manager.RyuApp):
 				rulePrinter = "Drop Rule for : ";
 				rulePrinter = rulePrinter , "switch:",str(shortestPath[0])," SRC: ",str(src)," DST: ",str(dst)
 				print(rulePrinter)
-			
-			
 
-				
+	def fence(self, key, msg):
+		barriers = []
+		for datapath in self.touched.values():
+			req = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+			datapath.send_msg(req)
+			barriers.append((datapath.id, req.xid))
+		self.touched = {}
+		if barriers:
+			self.pending.start(key, barriers).queued.append(msg)
+		else:
+			self.release(msg)
+
+	@set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+	def _barrier_reply_handler(self, ev):
+		setup = self.pending.complete(ev.msg.datapath.id, ev.msg.xid)
+		if setup is None:
+			return
+		for queued in setup.queued:
+			self.release(queued)
+
+	def release(self, msg):
+		#Unbuffered packet-ins carry the whole frame, which has to travel
+		#with the PacketOut; OFPP_TABLE runs it through the new rules
+		datapath = msg.datapath
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+
+		actions = [parser.OFPActionOutput(ofproto.OFPP_TABLE)]
+		data = None
+		if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+			data = msg.data
+		out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
+					in_port=msg.match['in_port'], actions=actions, data=data)
+		datapath.send_msg(out)
+
 	def isEven(self, nodeId):
 		if nodeId % 2 == 0:
 			return True
@@ -188,6 +250,13 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
+		#Skip FlowMods that would only repeat what the switch already has
+		key = flow_key(datapath.id, tableID, priority, match)
+		if not self.installed.needs_install(key, actions_key(actions)):
+			self.logger.debug('duplicate FlowMod to %016x suppressed (%d saved)',
+						datapath.id, self.installed.suppressed)
+			return
+
 		#Construct flow_mod message and send it
 		inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
 						     actions)]
@@ -197,14 +266,15 @@ class Controller1(app_manager.RyuApp):
 					instructions=inst)
 
 		datapath.send_msg(mod)
+		self.touched[datapath.id] = datapath
 	#--------------------------------------
 	# STEP 4: define monitoring function
 	#--------------------------------------
 	def _monitor(self):
 		while True:
-			for dp in self.switches.values():
+			for dp in self.poller.due():
 				self._request_stats(dp)
-			hub.sleep(5)
+			hub.sleep(self.poller.sleep_time())
 
 
 	#--------------------------------------
@@ -212,12 +282,10 @@ class Controller1(app_manager.RyuApp):
 	#--------------------------------------
 	def _request_stats(self, datapath):
 		self.logger.debug('send stats request: %016x', datapath.id)
-		if(datapath.id==5):
-			print('send stats request: %016x', datapath.id)
-			ofproto = datapath.ofproto
-			parser = datapath.ofproto_parser
-			req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
-			datapath.send_msg(req)
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
+		datapath.send_msg(req)
 
 
 	#--------------------------------------
@@ -234,12 +302,26 @@ class Controller1(app_manager.RyuApp):
 			  '--------------------------'
 			  '---------')
 
+		dpid = ev.msg.datapath.id
+		self.poller.reply(dpid,
+				sum(stat.rx_packets + stat.tx_packets for stat in ev.msg.body))
 		ports = []
 		for stat in ev.msg.body:
+			key = (dpid, stat.port_no)
+			self.port_counters.add(key,
+					(stat.rx_packets, stat.tx_packets, stat.rx_bytes, stat.tx_bytes),
+					stat.duration_sec + stat.duration_nsec * 1e-9)
+			#Rates need two samples; averaged over RATE_WINDOW seconds
+			rates = self.port_counters.rate(key)
+			average = self.port_counters.average(key, self.RATE_WINDOW)
+			if rates is None:
+				average = rates = (0.0, 0.0, 0.0, 0.0)
 			ports.append('port_no=%d '
-						 'rx_packets=%d '%
+						 'rx_packets=%d '
+						 'rx_pps=%.1f tx_pps=%.1f rx_pps_avg=%.1f '%
 						 (stat.port_no,
-                      	  stat.rx_packets))
+                      	  stat.rx_packets,
+						  rates[0], rates[1], average[0]))
 			self.logger.debug('PortStats: %s', ports)
 		print('PortStats: %s',ports)
 	#	self.logger.info('datapath         '
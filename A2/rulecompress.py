@@ -0,0 +1,231 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Flow rule compression.
+#
+# The controllers install one exact (eth_src, eth_dst) rule per decision.
+# compress() takes a switch's intended decisions, {(src, dst): action}
+# with integer keys (MACs or IPv4 addresses), and emits a smaller rule set
+# with the same outcome for every decided pair, using masks, priorities
+# and a default:
+#
+#  1. per destination, the most common action becomes its default and
+#     the sources that differ are exceptions;
+#  2. the destination defaults are aggregated with ORTC (minimal
+#     longest-prefix table), higher priority for longer masks;
+#  3. destinations whose sources differ the same way (same action, same
+#     sources) share exception rules: masks covering exactly those
+#     destinations times masks covering exactly those sources, above
+#     every destination rule.
+#
+# Keys nobody decided about are don't-cares: masks may cover them, so a
+# compressed table only agrees with the exact one on the decided pairs.
+# With default=MISS the catch-all stays the table-miss (packet-in)
+# rather than the most common action. MISS may also be a decision: where
+# it overrides a shorter mask it becomes an explicit rule with action
+# MISS, to be installed as output to the controller. Masks are tried both as prefixes
+# (high bits first) and as suffixes (low bits first, e.g. odd/even
+# addresses), whichever needs fewer rules. verify() replays sampled
+# decided pairs through the compressed table.
+#------------------------------------------------------------------------
+
+import random
+
+MISS = 'miss'
+
+DST_PRIORITY = 100
+EXCEPTION_PRIORITY = 1000
+
+
+class Rule(object):
+
+	__slots__ = ('priority', 'src', 'dst', 'action')
+
+	def __init__(self, priority, src, dst, action):
+		#src / dst: (value, mask), mask 0 meaning wildcard
+		self.priority = priority
+		self.src = src
+		self.dst = dst
+		self.action = action
+
+	def matches(self, src, dst):
+		return (src & self.src[1] == self.src[0] and
+			dst & self.dst[1] == self.dst[0])
+
+	def __repr__(self):
+		return 'Rule(%d, src=%x/%x, dst=%x/%x, %r)' % (self.priority,
+				self.src[0], self.src[1], self.dst[0], self.dst[1], self.action)
+
+
+def ortc(entries, width, default=None):
+	#Minimal longest-prefix table for entries {key: action}, keys missing
+	#from entries being don't-cares. Returns [(value, mask, length, action)];
+	#the zero-length entry is the catch-all, left out when default is given
+	#(the action everything unmatched gets anyway).
+	best = None
+	for order in (range(width - 1, -1, -1), range(width)):
+		table = _ortc(entries, list(order), default)
+		if best is None or len(table) < len(best):
+			best = table
+	return best
+
+
+def _ortc(entries, order, default):
+	items = sorted(entries.items())
+
+	#pass 1, bottom up: the actions a subtree can take without a rule below
+	def build(items, depth, value, mask):
+		actions = set(a for k, a in items)
+		if len(actions) == 1 or depth == len(order):
+			return (actions, value, mask, depth, None)
+		bit = 1 << order[depth]
+		low = [(k, a) for k, a in items if not k & bit]
+		high = [(k, a) for k, a in items if k & bit]
+		children = []
+		if low:
+			children.append(build(low, depth + 1, value, mask | bit))
+		if high:
+			children.append(build(high, depth + 1, value | bit, mask | bit))
+		if len(children) == 1:
+			#the other half is don't-care
+			return (children[0][0],) + children[0][1:]
+		common = children[0][0] & children[1][0]
+		return (common or (children[0][0] | children[1][0]), value, mask,
+				depth, children)
+
+	#pass 2, top down: a node needs a rule only if its parent's action is
+	#not one it can take
+	table = []
+
+	def assign(node, inherited):
+		actions, value, mask, depth, children = node
+		if inherited in actions:
+			chosen = inherited
+		else:
+			chosen = sorted(actions, key=repr)[0]
+			table.append((value, mask, depth, chosen))
+		for child in children or ():
+			assign(child, chosen)
+
+	if items:
+		root = build(items, 0, 0, 0)
+		if default is None:
+			chosen = sorted(root[0], key=repr)[0]
+			table.append((0, 0, 0, chosen))
+			for child in root[4] or ():
+				assign(child, chosen)
+		else:
+			assign(root, default)
+	return table
+
+
+def _cover(members, others, width):
+	#Disjoint masks covering every key in members and none in others
+	best = None
+	for order in (range(width - 1, -1, -1), range(width)):
+		order = list(order)
+		masks = []
+
+		def split(ins, outs, depth, value, mask):
+			if not outs or depth == width:
+				masks.append((value, mask))
+				return
+			bit = 1 << order[depth]
+			for side in (0, bit):
+				sub_in = [k for k in ins if k & bit == side]
+				if sub_in:
+					split(sub_in, [k for k in outs if k & bit == side],
+							depth + 1, value | side, mask | bit)
+
+		split(sorted(members), sorted(others), 0, 0, 0)
+		if best is None or len(masks) < len(best):
+			best = masks
+	return best
+
+
+def compress(decisions, width=48, default=None):
+	#decisions: {(src, dst): action}; returns [Rule], highest priority first
+	by_dst = {}
+	for (src, dst), action in decisions.items():
+		by_dst.setdefault(dst, {})[src] = action
+
+	#1. per destination default, and the sources taking each other action
+	defaults = {}
+	groups = {}
+	for dst, srcs in by_dst.items():
+		counts = {}
+		for action in srcs.values():
+			counts[action] = counts.get(action, 0) + 1
+		dst_default = sorted(counts, key=lambda a: (-counts[a], repr(a)))[0]
+		defaults[dst] = dst_default
+		exceptions = {}
+		for src, action in srcs.items():
+			if action != dst_default:
+				exceptions.setdefault(action, []).append(src)
+		for action, others in exceptions.items():
+			groups.setdefault((action, tuple(sorted(others))), []).append(dst)
+
+	rules = []
+
+	#2. destination layer
+	for value, mask, length, action in ortc(defaults, width, default):
+		if action != MISS or length:
+			rules.append(Rule(DST_PRIORITY + length, (0, 0), (value, mask), action))
+
+	#3. exception layer: the destination masks only cover the group's
+	#destinations and the source masks only sources those destinations
+	#send somewhere else, so no two exception rules overlap on a decided
+	#pair and one priority does
+	for (action, srcs), dsts in groups.items():
+		members = set(dsts)
+		others = [d for d in by_dst if d not in members]
+		conflicting = set()
+		for dst in dsts:
+			for src, other in by_dst[dst].items():
+				if other != action:
+					conflicting.add(src)
+		src_masks = _cover(srcs, conflicting, width)
+		for dst_value, dst_mask in _cover(members, others, width):
+			for src_value, src_mask in src_masks:
+				rules.append(Rule(EXCEPTION_PRIORITY, (src_value, src_mask),
+							(dst_value, dst_mask), action))
+
+	rules.sort(key=lambda r: -r.priority)
+	return rules
+
+
+def lookup(rules, src, dst):
+	#rules sorted highest priority first
+	for rule in rules:
+		if rule.matches(src, dst):
+			return rule.action
+	return MISS
+
+
+def verify(decisions, rules, samples=10000, seed=0):
+	#Mismatching (src, dst, expected, got), over every decided pair or a
+	#random sample of them
+	keys = sorted(decisions)
+	if len(keys) > samples:
+		keys = random.Random(seed).sample(keys, samples)
+
+	#tuple space search: one hash table per (src mask, dst mask)
+	spaces = {}
+	for rule in rules:
+		masks = (rule.src[1], rule.dst[1])
+		table = spaces.setdefault(masks, {})
+		key = (rule.src[0], rule.dst[0])
+		if key not in table or table[key].priority < rule.priority:
+			table[key] = rule
+
+	wrong = []
+	for src, dst in keys:
+		best = None
+		for (src_mask, dst_mask), table in spaces.items():
+			rule = table.get((src & src_mask, dst & dst_mask))
+			if rule is not None and (best is None or rule.priority > best.priority):
+				best = rule
+		got = best.action if best is not None else MISS
+		if got != decisions[(src, dst)]:
+			wrong.append((src, dst, decisions[(src, dst)], got))
+	return wrong
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Per-datapath coalescing send queue.
+#
+# datapath.send_msg() serializes every message and hands it to the
+# switch's send loop on its own, so pushing a path or a proactive policy
+# turns into one small socket write per FlowMod. Messages sent through
+# this queue are serialized straight away (so their xid is known, e.g.
+# for barriers) but only appended to a per-datapath buffer. The buffer
+# goes out as a single datapath.send() once the current event handler
+# yields, i.e. once per event-loop tick.
+#
+# Backpressure: when a datapath's buffer reaches high_water bytes it is
+# written immediately. That write enters Ryu's bounded send queue, which
+# blocks the producer while the switch connection cannot keep up, so a
+# big install is throttled instead of piling up in controller memory.
+#------------------------------------------------------------------------
+
+from ryu.lib import hub
+
+
+class SendQueue(object):
+
+	def __init__(self, high_water=64 * 1024):
+		self.high_water = high_water
+		self.buffers = {}
+		self.queued = {}
+		self.datapaths = {}
+		self.scheduled = set()
+
+		#metrics, per dpid
+		self.messages = {}
+		self.writes = {}
+		self.max_depth = {}
+		self.high_water_flushes = {}
+
+	def send(self, datapath, msg):
+		if msg.xid is None:
+			datapath.set_xid(msg)
+		msg.serialize()
+		self.send_raw(datapath, msg.buf)
+
+	def next_xid(self, datapath):
+		#Same xid sequence datapath.set_xid() uses, for pre-encoded messages
+		datapath.xid = (datapath.xid + 1) & datapath.ofproto.MAX_XID
+		return datapath.xid
+
+	def send_raw(self, datapath, buf):
+		dpid = datapath.id
+		self.datapaths[dpid] = datapath
+		self.buffers.setdefault(dpid, []).append(buf)
+		self.messages[dpid] = self.messages.get(dpid, 0) + 1
+
+		depth = self.queued.get(dpid, 0) + len(buf)
+		self.queued[dpid] = depth
+		if depth > self.max_depth.get(dpid, 0):
+			self.max_depth[dpid] = depth
+		if depth >= self.high_water:
+			self.high_water_flushes[dpid] = self.high_water_flushes.get(dpid, 0) + 1
+			self.flush(dpid)
+		elif dpid not in self.scheduled:
+			self.scheduled.add(dpid)
+			hub.spawn(self._flush_later, dpid)
+
+	def depth(self, dpid):
+		#Bytes queued for dpid and not yet handed to its connection
+		return self.queued.get(dpid, 0)
+
+	def flush(self, dpid):
+		bufs = self.buffers.pop(dpid, None)
+		self.queued.pop(dpid, None)
+		if not bufs:
+			return
+		self.writes[dpid] = self.writes.get(dpid, 0) + 1
+		self.datapaths[dpid].send(b''.join(bufs))
+
+	def forget(self, dpid):
+		self.buffers.pop(dpid, None)
+		self.queued.pop(dpid, None)
+		self.datapaths.pop(dpid, None)
+
+	def stats(self, dpid):
+		return {'queued_bytes': self.depth(dpid),
+			'max_queued_bytes': self.max_depth.get(dpid, 0),
+			'messages': self.messages.get(dpid, 0),
+			'writes': self.writes.get(dpid, 0),
+			'high_water_flushes': self.high_water_flushes.get(dpid, 0)}
+
+	def _flush_later(self, dpid):
+		#Runs once the handler that queued the messages has yielded
+		hub.sleep(0)
+		self.scheduled.discard(dpid)
+		self.flush(dpid)
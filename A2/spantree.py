@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Incrementally maintained spanning tree over the switch graph.
+#
+# The topology has cycles (the triangle in A1, s1-s2-s3 and s4-s5-s6 in
+# q1-topo.py), so flooding out of every port would loop. Broadcasts are
+# flooded along this tree instead: every switch forwards to its tree
+# neighbours and its edge ports only.
+#
+# Only links known in both directions are used. Changes are applied in
+# place and report the switches whose set of tree ports changed, so only
+# their flood groups have to be rewritten:
+#   - a new link joins two trees or is left out as a redundant link;
+#   - a removed non-tree link changes nothing;
+#   - a removed tree link splits the tree, and one redundant link across
+#     the cut (if any) is promoted to reconnect it.
+#------------------------------------------------------------------------
+
+from collections import deque
+
+
+class SpanningTree(object):
+
+	def __init__(self):
+		self.adj = {}
+		self.tree = {}
+
+	def __contains__(self, dpid):
+		return dpid in self.adj
+
+	def neighbors(self, dpid):
+		return sorted(self.tree.get(dpid, ()))
+
+	def edges(self):
+		return [(u, v) for u in self.tree for v in self.tree[u] if u < v]
+
+	def add_switch(self, dpid):
+		self.adj.setdefault(dpid, set())
+		self.tree.setdefault(dpid, set())
+
+	def add_link(self, u, v):
+		#Returns the switches whose tree ports changed
+		self.add_switch(u)
+		self.add_switch(v)
+		if v in self.adj[u]:
+			return set()
+		self.adj[u].add(v)
+		self.adj[v].add(u)
+		if v in self._component(u):
+			return set()
+		self._join(u, v)
+		return set([u, v])
+
+	def remove_link(self, u, v):
+		if v not in self.adj.get(u, ()):
+			return set()
+		self.adj[u].discard(v)
+		self.adj[v].discard(u)
+		if v not in self.tree[u]:
+			return set()
+		self.tree[u].discard(v)
+		self.tree[v].discard(u)
+		changed = set([u, v])
+
+		#Reconnect the two halves through any remaining link across the cut
+		side = self._component(u)
+		if v in side:
+			return changed
+		for a in side:
+			for b in self.adj[a]:
+				if b not in side:
+					self._join(a, b)
+					changed.update((a, b))
+					return changed
+		return changed
+
+	def remove_switch(self, dpid):
+		changed = set()
+		for v in list(self.adj.get(dpid, ())):
+			changed |= self.remove_link(dpid, v)
+		self.adj.pop(dpid, None)
+		self.tree.pop(dpid, None)
+		changed.discard(dpid)
+		return changed
+
+	def _join(self, u, v):
+		self.tree[u].add(v)
+		self.tree[v].add(u)
+
+	def _component(self, root):
+		seen = set([root])
+		queue = deque([root])
+		while queue:
+			node = queue.popleft()
+			for nbr in self.tree.get(node, ()):
+				if nbr not in seen:
+					seen.add(nbr)
+					queue.append(nbr)
+		return seen
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Staggered, adaptive stats polling.
+#
+# A monitor loop that asks every switch for its stats at the same instant
+# every N seconds gets all the replies back in one burst, and polls idle
+# switches as often as busy ones. StatsPoller keeps one schedule per
+# switch instead:
+#
+#  - only the switches in the configured set are polled (all if None);
+#  - a switch's first poll is at a random phase within its interval, and
+#    every later one is jittered by +-jitter, so the polls stay spread
+#    over the interval instead of lining up again;
+#  - replies report a counter total; when it moved since the previous
+#    reply the switch's interval is halved (down to min_interval, by
+#    default half the base interval), when it did not the interval grows
+#    by half (up to max_interval, by default twice the base interval).
+#    A wider range saves more requests on idle switches but notices them
+#    turning busy later (see bench_stats.py).
+#
+# The poller only schedules: due() returns the datapaths whose poll time
+# has come, and sleep_time() how long the loop can sleep until the next
+# one. What is requested (narrowed to a table, cookie or port) is up to
+# the caller.
+#------------------------------------------------------------------------
+
+import random
+import time
+
+
+class PollState(object):
+
+	__slots__ = ('datapath', 'interval', 'next_due', 'total')
+
+	def __init__(self, datapath, interval, next_due):
+		self.datapath = datapath
+		self.interval = interval
+		self.next_due = next_due
+		self.total = None
+
+
+class StatsPoller(object):
+
+	def __init__(self, switches=None, interval=10.0, min_interval=None,
+				max_interval=None, jitter=0.1, clock=time.time, seed=None):
+		self.switches = switches
+		self.interval = interval
+		self.min_interval = min_interval or interval / 2.0
+		self.max_interval = max_interval or interval * 2.0
+		self.jitter = jitter
+		self.clock = clock
+		self.random = random.Random(seed)
+		self.states = {}
+
+		#metrics
+		self.polls = 0
+		self.faster = 0
+		self.slower = 0
+
+	def __contains__(self, dpid):
+		return dpid in self.states
+
+	def __len__(self):
+		return len(self.states)
+
+	def add(self, datapath):
+		dpid = datapath.id
+		if self.switches is not None and dpid not in self.switches:
+			return
+		if dpid in self.states:
+			self.states[dpid].datapath = datapath
+			return
+		phase = self.random.uniform(0, self.interval)
+		self.states[dpid] = PollState(datapath, self.interval, self.clock() + phase)
+
+	def remove(self, dpid):
+		self.states.pop(dpid, None)
+
+	def due(self):
+		now = self.clock()
+		ready = []
+		for state in self.states.values():
+			if state.next_due <= now:
+				spread = 1 + self.random.uniform(-self.jitter, self.jitter)
+				state.next_due = now + state.interval * spread
+				ready.append(state.datapath)
+		self.polls += len(ready)
+		return ready
+
+	def sleep_time(self):
+		if not self.states:
+			return self.min_interval
+		wake = min(state.next_due for state in self.states.values())
+		return min(self.min_interval, max(0.0, wake - self.clock()))
+
+	def reply(self, dpid, total):
+		#total: any counter sum of the reply, e.g. packets over all ports
+		state = self.states.get(dpid)
+		if state is None:
+			return
+		if state.total is not None:
+			if total != state.total:
+				interval = max(self.min_interval, state.interval / 2)
+				self.faster += 1
+			else:
+				interval = min(self.max_interval, state.interval * 1.5)
+				self.slower += 1
+			if interval < state.interval:
+				#Pull the next poll in rather than wait out the old interval
+				state.next_due = min(state.next_due, self.clock() + interval)
+			state.interval = interval
+		state.total = total
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Compact topology store for the A2 controllers.
+#
+# Replaces the networkx DiGraph that used to hold switches and hosts.
+# Switch dpids are mapped to dense indices; links are __slots__ records
+# and neighbor scans go through a CSR layout (offsets/targets/ports
+# arrays) that is rebuilt lazily after the link set changes. Hosts are
+# not part of the graph, they live in hosttable.HostTable.
+#
+# Ports are tracked with their liveness. A port is only an edge port
+# (flooded to, hosts learned on it) while it is live and has never
+# carried a link, and only once a host was seen on it or it has been live
+# for `settle` seconds: right after a switch connects LLDP has not found
+# its links yet, and flooding an inter-switch port then loops. A port
+# keeps its link history until it goes down or is deleted, so a link
+# dropped on an LLDP timeout does not turn into a flood port.
+#
+# The queries mirror what the controllers asked networkx for:
+#   x in net                  -> switch dpid connected?
+#   net[u][v]['port']         -> net.port(u, v)
+#------------------------------------------------------------------------
+
+import time
+from array import array
+
+
+def mac_to_int(mac):
+	return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(value):
+	return ':'.join('%02x' % ((value >> s) & 0xff) for s in range(40, -8, -8))
+
+
+class Link(object):
+
+	__slots__ = ('src', 'dst', 'port')
+
+	def __init__(self, src, dst, port):
+		self.src = src
+		self.dst = dst
+		self.port = port
+
+
+class ChangeSet(object):
+
+	#Delta applied by one topology event, handed to the caches built on top
+	#of the topology so they only invalidate what the change touches
+
+	__slots__ = ('switches_added', 'switches_removed', 'links_added',
+			'links_removed', 'ports_changed', 'paths_changed')
+
+	def __init__(self):
+		self.switches_added = []
+		self.switches_removed = []
+		self.links_added = []
+		self.links_removed = []
+		self.ports_changed = []
+		#(src dpid, dst dpid) pairs whose cached path an added link shortened
+		self.paths_changed = []
+
+	def __bool__(self):
+		return bool(self.switches_added or self.switches_removed or
+				self.links_added or self.links_removed or self.ports_changed)
+
+	__nonzero__ = __bool__
+
+
+class Topology(object):
+
+	def __init__(self, settle=10.0, clock=time.time):
+		#switches: dpid -> index, index -> dpid; an index outlives its
+		#switch, the switches connected now are in self.live
+		self.index = {}
+		self.dpids = array('Q')
+		self.live = set()
+
+		#directed links keyed by (src index, dst index)
+		self.links = {}
+
+		#CSR view of self.links, valid while not self.dirty
+		self.offsets = array('l', [0])
+		self.targets = array('l')
+		self.ports = array('l')
+		self.dirty = False
+
+		#physical ports of every switch, dpid -> set of port numbers
+		self.switch_ports = {}
+
+		#(dpid, port) -> time it came up; ports that carried a link since;
+		#ports a host was seen on
+		self.settle = settle
+		self.clock = clock
+		self.live_since = {}
+		self.linked_ports = set()
+		self.host_ports = set()
+
+	def __contains__(self, dpid):
+		return dpid in self.live
+
+	def __len__(self):
+		return len(self.live)
+
+	#--------------------------------------------------
+	# Switches and links
+	#--------------------------------------------------
+	def add_switch(self, dpid):
+		self.live.add(dpid)
+		return self._slot(dpid)
+
+	def _slot(self, dpid):
+		if dpid not in self.index:
+			self.index[dpid] = len(self.dpids)
+			self.dpids.append(dpid)
+			self.dirty = True
+		return self.index[dpid]
+
+	def add_link(self, src, dst, port):
+		key = (self._slot(src), self._slot(dst))
+		link = self.links.get(key)
+		if link is None:
+			self.links[key] = Link(key[0], key[1], port)
+			self.dirty = True
+		elif link.port != port:
+			link.port = port
+			self.dirty = True
+		self.linked_ports.add((src, port))
+
+	def remove_link(self, src, dst):
+		key = (self.index.get(src), self.index.get(dst))
+		if self.links.pop(key, None) is not None:
+			self.dirty = True
+
+	def remove_switch(self, dpid):
+		#Drops the switch's links; its slot is kept so the indices of the
+		#other switches stay stable, and it is added again if it rejoins.
+		#Returns the removed links.
+		self.live.discard(dpid)
+		i = self.index.get(dpid)
+		if i is None:
+			return []
+		dpids = self.dpids
+		removed = [(dpids[u], dpids[v]) for (u, v) in self.links if i in (u, v)]
+		for (u, v) in removed:
+			self.remove_link(u, v)
+		for port_no in self.switch_ports.pop(dpid, ()):
+			self._forget_port(dpid, port_no)
+		return removed
+
+	def add_port(self, dpid, port_no, live=True):
+		self.switch_ports.setdefault(dpid, set()).add(port_no)
+		self.set_port_live(dpid, port_no, live)
+
+	def remove_port(self, dpid, port_no):
+		self.switch_ports.get(dpid, set()).discard(port_no)
+		self._forget_port(dpid, port_no)
+
+	def set_port_live(self, dpid, port_no, live):
+		key = (dpid, port_no)
+		if not live:
+			#Unplugged: whatever is attached next is discovered again
+			self._forget_port(dpid, port_no)
+		elif key not in self.live_since:
+			self.live_since[key] = self.clock()
+
+	def _forget_port(self, dpid, port_no):
+		key = (dpid, port_no)
+		self.live_since.pop(key, None)
+		self.linked_ports.discard(key)
+		self.host_ports.discard(key)
+
+	def host_seen(self, dpid, port_no):
+		self.host_ports.add((dpid, port_no))
+
+	def may_host(self, dpid, port_no):
+		#Not a port with a switch behind it, now or since it came up
+		return (dpid, port_no) not in self.linked_ports
+
+	def edge_ports(self, dpid):
+		#Live ports of dpid where hosts are, or could be now that discovery
+		#had time to find its links
+		now = self.clock()
+		ports = []
+		for port_no in self.switch_ports.get(dpid, ()):
+			key = (dpid, port_no)
+			since = self.live_since.get(key)
+			if since is None or key in self.linked_ports:
+				continue
+			if key in self.host_ports or now - since >= self.settle:
+				ports.append(port_no)
+		return sorted(ports)
+
+	def settle_time(self, dpid):
+		#Seconds until the next live, unlinked port of dpid becomes an edge
+		#port without a host seen on it, or None
+		now = self.clock()
+		waits = [self.live_since[key] + self.settle - now
+			for key in ((dpid, port_no) for port_no in self.switch_ports.get(dpid, ()))
+			if key in self.live_since and key not in self.linked_ports
+				and key not in self.host_ports
+				and now - self.live_since[key] < self.settle]
+		return min(waits) if waits else None
+
+	def links_on_port(self, dpid, port):
+		#Switches reached from dpid through the given port
+		if dpid not in self.live:
+			return []
+		if self.dirty:
+			self._build()
+		i = self.index[dpid]
+		lo, hi = self.offsets[i], self.offsets[i + 1]
+		return [self.dpids[self.targets[k]] for k in range(lo, hi)
+				if self.ports[k] == port]
+
+	def has_link(self, src, dst):
+		return (self.index.get(src), self.index.get(dst)) in self.links
+
+	def switches(self):
+		return [dpid for dpid in self.dpids if dpid in self.live]
+
+	def edges(self):
+		dpids = self.dpids
+		return [(dpids[l.src], dpids[l.dst]) for l in self.links.values()]
+
+	def neighbors(self, dpid):
+		if self.dirty:
+			self._build()
+		i = self.index[dpid]
+		dpids = self.dpids
+		return [dpids[j] for j in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+	def port(self, src, dst):
+		#Output port on switch src towards switch dst
+		return self.links[(self.index[src], self.index[dst])].port
+
+	def _build(self):
+		n = len(self.dpids)
+		counts = [0] * (n + 1)
+		for (i, j) in self.links:
+			counts[i + 1] += 1
+		for i in range(n):
+			counts[i + 1] += counts[i]
+		offsets = array('l', counts)
+		targets = array('l', [0] * len(self.links))
+		ports = array('l', [0] * len(self.links))
+		fill = list(counts)
+		for (i, j), link in self.links.items():
+			targets[fill[i]] = j
+			ports[fill[i]] = link.port
+			fill[i] += 1
+		self.offsets, self.targets, self.ports = offsets, targets, ports
+		self.dirty = False
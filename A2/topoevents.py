@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Incremental topology maintenance for the A2 controllers.
+#
+# Instead of re-reading every switch and link with get_switch/get_link on
+# each EventSwitchEnter, the topology is updated from the individual
+# switch, link and port events, and each event only applies its own delta
+# to self.net, self.paths and self.hosts. The resulting ChangeSet is passed to
+# topology_changed(), which controllers override to invalidate whatever
+# they derived from the topology (trees, installed flows, ...).
+#
+# Link events need ryu-manager --observe-links.
+#------------------------------------------------------------------------
+
+from ryu.controller.handler import set_ev_cls
+from ryu.topology import event
+
+from topocore import ChangeSet
+
+
+class TopologyEvents(object):
+
+	@set_ev_cls(event.EventSwitchEnter)
+	def _switch_enter_handler(self, ev):
+		dpid = ev.switch.dp.id
+		changes = ChangeSet()
+		if dpid not in self.net:
+			changes.switches_added.append(dpid)
+		self.net.add_switch(dpid)
+		for port in ev.switch.ports:
+			self.net.add_port(dpid, port.port_no, port.is_live())
+		self.paths.add_switch(dpid)
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventSwitchLeave)
+	def _switch_leave_handler(self, ev):
+		dpid = ev.switch.dp.id
+		changes = ChangeSet()
+		changes.switches_removed.append(dpid)
+		changes.links_removed.extend(self.net.remove_switch(dpid))
+		self.paths.remove_switch(dpid)
+		self.hosts.remove_switch(dpid)
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventLinkAdd)
+	def _link_add_handler(self, ev):
+		#Link events are directed, the reverse direction has its own event
+		link = ev.link
+		changes = ChangeSet()
+		if not self.net.has_link(link.src.dpid, link.dst.dpid):
+			changes.links_added.append((link.src.dpid, link.dst.dpid))
+		self.net.add_link(link.src.dpid, link.dst.dpid, link.src.port_no)
+		changes.paths_changed.extend(self.paths.add_link(link.src.dpid, link.dst.dpid))
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventLinkDelete)
+	def _link_delete_handler(self, ev):
+		link = ev.link
+		changes = ChangeSet()
+		self._remove_link(link.src.dpid, link.dst.dpid, changes)
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventPortAdd)
+	def _port_add_handler(self, ev):
+		changes = ChangeSet()
+		changes.ports_changed.append(ev.port.dpid)
+		self.net.add_port(ev.port.dpid, ev.port.port_no, ev.port.is_live())
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventPortDelete)
+	def _port_delete_handler(self, ev):
+		changes = ChangeSet()
+		changes.ports_changed.append(ev.port.dpid)
+		self.net.remove_port(ev.port.dpid, ev.port.port_no)
+		self._apply_changes(changes)
+
+	@set_ev_cls(event.EventPortModify)
+	def _port_modify_handler(self, ev):
+		#A port going down takes both directions of its link with it right
+		#away, without waiting for the LLDP timeout
+		port = ev.port
+		changes = ChangeSet()
+		changes.ports_changed.append(port.dpid)
+		if not port.is_live():
+			for peer in self.net.links_on_port(port.dpid, port.port_no):
+				self._remove_link(port.dpid, peer, changes)
+				self._remove_link(peer, port.dpid, changes)
+		self.net.set_port_live(port.dpid, port.port_no, port.is_live())
+		self._apply_changes(changes)
+
+	def _remove_link(self, src, dst, changes):
+		if self.net.has_link(src, dst):
+			self.net.remove_link(src, dst)
+			changes.links_removed.append((src, dst))
+		self.paths.remove_link(src, dst)
+
+	def _apply_changes(self, changes):
+		if changes:
+			self.logger.debug('topology change: +%s -%s links',
+						changes.links_added, changes.links_removed)
+			self.topology_changed(changes)
+
+	def topology_changed(self, changes):
+		pass
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+#------------------------------------------------------------------------
+# Generated topologies for the offline benchmarks.
+#
+# Switches are numbered 1..n like the dpids in q1-topo.py, port 1 of every
+# switch is reserved for its first host and inter-switch ports are handed
+# out from 2 upwards, the same way Mininet numbers them.
+#------------------------------------------------------------------------
+
+import random
+
+from topocore import int_to_mac
+
+
+def random_topology(n_switches, extra_links, seed=0):
+	#Random spanning tree plus extra_links random chords.
+	#Returns {(u, v): out_port} with both directions present
+	rnd = random.Random(seed)
+	next_port = dict((s, 2) for s in range(1, n_switches + 1))
+	links = {}
+
+	def connect(u, v):
+		if u == v or (u, v) in links:
+			return False
+		links[(u, v)] = next_port[u]
+		links[(v, u)] = next_port[v]
+		next_port[u] += 1
+		next_port[v] += 1
+		return True
+
+	for s in range(2, n_switches + 1):
+		connect(s, rnd.randint(1, s - 1))
+
+	added = 0
+	while added < extra_links and n_switches > 2:
+		if connect(rnd.randint(1, n_switches), rnd.randint(1, n_switches)):
+			added += 1
+	return links
+
+
+def attach_hosts(n_switches, n_hosts, seed=0):
+	#{mac: (dpid, port)}, one host per switch first (on port 1, as in
+	#q1-topo.py) and the rest on random switches from port 1000 upwards
+	rnd = random.Random(seed)
+	next_port = {}
+	hosts = {}
+	for i in range(n_hosts):
+		dpid = i + 1 if i < n_switches else rnd.randint(1, n_switches)
+		port = next_port.get(dpid, 1)
+		next_port[dpid] = port + 1 if port > 1 else 1000
+		hosts[int_to_mac(i + 1)] = (dpid, port)
+	return hosts
+
+
+def adjacency(links):
+	adj = {}
+	for (u, v) in links:
+		adj.setdefault(u, set()).add(v)
+		adj.setdefault(v, set())
+	return adj
@@ -105,12 +105,18 @@ class Controller1(app_manager.RyuApp):
 	#---------------------------------------------------------
 	# STEP 3: install group rule
 	#---------------------------------------------------------			
-	def add_group(self, datapath, group_id, buckets):
+	def add_group(self, datapath, group_id, buckets, group_type=None, command=None):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		req = parser.OFPGroupMod(datapath, ofproto.OFPGC_ADD,
-                                 ofproto.OFPGT_FF, group_id, buckets)
+		#Fast-failover unless told otherwise (e.g. OFPGT_SELECT for ECMP)
+		if group_type is None:
+			group_type = ofproto.OFPGT_FF
+		if command is None:
+			command = ofproto.OFPGC_ADD
+
+		req = parser.OFPGroupMod(datapath, command,
+                                 group_type, group_id, buckets)
 		out = datapath.send_msg(req)
 
 
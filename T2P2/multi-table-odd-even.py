@@ -14,10 +14,43 @@ from ryu.lib.packet import packet
 #------------------------------------------------------------
 # STEP 3: import libraries for parsing L3/L4 headers
 #------------------------------------------------------------
-from ryu.lib.packet import ethernet, ipv4, tcp
+from ryu.lib.packet import ethernet, tcp
+
+import struct
 
 import networkx as nx
 
+ETH_TYPE_IP = 0x0800
+
+#------------------------------------------------------------
+# Header fast path: read eth src/dst and the TCP destination
+# port at fixed offsets from a memoryview of the frame instead
+# of building the whole packet.Packet object graph. Untagged
+# IPv4 and non-IP frames are answered directly; VLAN, IPv6,
+# fragments and truncated frames go through the full parse.
+#------------------------------------------------------------
+def parse_headers(data):
+	view = memoryview(data)
+	if len(view) >= 14:
+		dst = view[0:6].hex(':')
+		src = view[6:12].hex(':')
+		ethertype = struct.unpack_from('!H', view, 12)[0]
+		if ethertype not in (ETH_TYPE_IP, 0x8100, 0x88a8, 0x86dd):
+			return src, dst, None
+		if (ethertype == ETH_TYPE_IP and len(view) >= 34 and view[14] >> 4 == 4
+				and not struct.unpack_from('!H', view, 20)[0] & 0x1fff):
+			if view[23] != 6:
+				return src, dst, None
+			l4 = 14 + (view[14] & 0x0f) * 4
+			if len(view) >= l4 + 4:
+				return src, dst, struct.unpack_from('!H', view, l4 + 2)[0]
+
+	pkt = packet.Packet(data)
+	eth = pkt.get_protocol(ethernet.ethernet)
+	tcp_info = pkt.get_protocol(tcp.tcp)
+	return eth.src, eth.dst, tcp_info.dst_port if tcp_info is not None else None
+
+
 class Controller1(app_manager.RyuApp):
 
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -73,18 +106,12 @@ class Controller1(app_manager.RyuApp):
 		datapath = msg.datapath
 		ofproto = datapath.ofproto
 
-		pkt = packet.Packet(msg.data)
-		eth = pkt.get_protocol(ethernet.ethernet)
-
 		#--------------------------------------------------
 		# STEP 4: parse upper layer info
 		#--------------------------------------------------
-		ip = pkt.get_protocol(ipv4.ipv4)
-		tcp_info = pkt.get_protocol(tcp.tcp)
+		src, dst, tcp_dst = parse_headers(msg.data)
 
 		dpid = datapath.id
-		src = eth.src
-		dst = eth.dst
 
 		#Add end hosts to discovered topo
 		if src not in self.net:
@@ -100,13 +127,13 @@ class Controller1(app_manager.RyuApp):
 		#--------------------------------------------------
 		# STEP 5a: check whether tcp packet
 		#--------------------------------------------------		
-		elif src in self.net and dst in self.net and tcp_info != None:
+		elif src in self.net and dst in self.net and tcp_dst != None:
 			print(">>>> Add your logic here <<<<")
 
 			#--------------------------------------------------
 			# STEP 5b: implement routing logic
 			#--------------------------------------------------
-			dst_port = tcp_info.dst_port
+			dst_port = tcp_dst
 
 			parser = datapath.ofproto_parser
 
@@ -129,7 +156,13 @@ class Controller1(app_manager.RyuApp):
 			#Forward original packet
 			parser = datapath.ofproto_parser
 
-			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions)
+			#The table-miss rule uses OFPCML_NO_BUFFER, so the switch kept no
+			#copy of the packet and the payload must be sent back with it
+			data = None
+			if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+				data = msg.data
+
+			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions, data=data)
 			datapath.send_msg(out)
 
 
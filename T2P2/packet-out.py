@@ -93,7 +93,13 @@ class Controller1(app_manager.RyuApp):
 			#Forward original packet
 			parser = datapath.ofproto_parser
 
-			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions)
+			#The table-miss rule uses OFPCML_NO_BUFFER, so the switch kept no
+			#copy of the packet and the payload must be sent back with it
+			data = None
+			if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+				data = msg.data
+
+			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions, data=data)
 			datapath.send_msg(out)
 
 
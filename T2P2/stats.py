@@ -23,6 +23,16 @@ from ryu.lib.packet import ethernet
 from ryu.lib import hub
 
 import networkx as nx
+import time
+
+# Marker bit of the forwarding rules' cookies; stats requests ask for these
+# rules only. The low bits hold the destination MAC, so every rule of a
+# switch has its own cookie.
+FORWARD_COOKIE = 1 << 63
+
+# Every switch is asked once per STATS_INTERVAL s, the requests spread out
+# over the interval instead of sent all at once
+STATS_INTERVAL = 10
 
 class Controller1(app_manager.RyuApp):
 
@@ -37,6 +47,7 @@ class Controller1(app_manager.RyuApp):
 		# STEP 2a: store switch datapaths
 		#--------------------------------------
 		self.datapaths = {}
+		self.last_counts = {}
 
 		#--------------------------------------
 		# STEP 3: start monitor thread
@@ -59,6 +70,8 @@ class Controller1(app_manager.RyuApp):
 			if datapath.id in self.datapaths:
 				self.logger.debug('unregister datapath: %016x', datapath.id)
 				del self.datapaths[datapath.id]
+				for key in [key for key in self.last_counts if key[0] == datapath.id]:
+					del self.last_counts[key]
 
 		
 	@set_ev_cls(event.EventSwitchEnter)
@@ -124,17 +137,24 @@ class Controller1(app_manager.RyuApp):
 			out_port = self.net[dpid][dst]['port']
 			actions = [parser.OFPActionOutput(out_port)]
 			
-			self.add_flow(datapath, 1, match, actions)
+			cookie = FORWARD_COOKIE | int(dst.replace(':', ''), 16)
+			self.add_flow(datapath, 1, match, actions, cookie)
 			print("Added rule: eth=", dst, " out_port=", out_port)
 
 			#Forward original packet
 			parser = datapath.ofproto_parser
 
-			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions)
+			#The table-miss rule uses OFPCML_NO_BUFFER, so the switch kept no
+			#copy of the packet and the payload must be sent back with it
+			data = None
+			if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+				data = msg.data
+
+			out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions, data=data)
 			datapath.send_msg(out)
 
 
-	def add_flow(self, datapath, priority, match, actions):
+	def add_flow(self, datapath, priority, match, actions, cookie=0):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
@@ -142,7 +162,7 @@ class Controller1(app_manager.RyuApp):
 		inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
 						     actions)]
 
-		mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+		mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie, priority=priority,
 					match=match, instructions=inst)
 
 		datapath.send_msg(mod)
@@ -153,9 +173,12 @@ class Controller1(app_manager.RyuApp):
 	#--------------------------------------
 	def _monitor(self):
 		while True:
-			for dp in self.datapaths.values():
+			datapaths = list(self.datapaths.values())
+			if not datapaths:
+				hub.sleep(STATS_INTERVAL)
+			for dp in datapaths:
 				self._request_stats(dp)
-			hub.sleep(10)
+				hub.sleep(float(STATS_INTERVAL) / len(datapaths))
 
 
 	#--------------------------------------
@@ -166,7 +189,11 @@ class Controller1(app_manager.RyuApp):
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
 
-		req = parser.OFPFlowStatsRequest(datapath)
+		#Only table 0's forwarding rules, so the table-miss rule and anything
+		#else installed by other apps stay out of the reply
+		req = parser.OFPFlowStatsRequest(datapath, 0, 0, ofproto.OFPP_ANY,
+						ofproto.OFPG_ANY, FORWARD_COOKIE, FORWARD_COOKIE,
+						parser.OFPMatch())
 		datapath.send_msg(req)
 
 
@@ -187,20 +214,33 @@ class Controller1(app_manager.RyuApp):
 
 		self.logger.info('datapath         '
 						'eth-dst           '
-						'out-port packets  bytes')
+						'out-port packets  bytes    pkt/s    bytes/s')
 		self.logger.info('---------------- '
 						'----------------- '
-						'-------- -------- --------')
+						'-------- -------- -------- -------- --------')
 
 		body = ev.msg.body
 
+		#Rates from the previous reply; a counter that went back (the rule was
+		#re-added) starts over
+		dpid = ev.msg.datapath.id
+		now = time.time()
 		for flow in body:
 			if flow.priority == 1:
-				self.logger.info('%016X %17s %8x %8d %8d',
+				key = (dpid, flow.cookie)
+				last = self.last_counts.get(key)
+				self.last_counts[key] = (now, flow.packet_count, flow.byte_count)
+				pps = bps = 0.0
+				if (last is not None and now > last[0] and flow.packet_count >= last[1]
+						and flow.byte_count >= last[2]):
+					pps = (flow.packet_count - last[1]) / (now - last[0])
+					bps = (flow.byte_count - last[2]) / (now - last[0])
+				self.logger.info('%016X %17s %8x %8d %8d %8.1f %8.1f',
  							ev.msg.datapath.id,
 							flow.match['eth_dst'],
 							flow.instructions[0].actions[0].port,
-							flow.packet_count, flow.byte_count)
+							flow.packet_count, flow.byte_count,
+							pps, bps)
 		
 		print('\n')
 